@@ -0,0 +1,86 @@
+import sys
+
+import numpy as np
+
+from corpus_cache import load_corpus
+
+MEASURES = ("pmi", "t_score", "log_likelihood")
+
+
+def count_unigrams_bigrams(ids, vocab_size):
+    """
+    Unigram and bigram counts of a token id array in one pass.
+    Returns (unigram_counts, first, second, bigram_counts): counts per token id,
+    and every distinct bigram as its two ids with its count.
+    """
+    unigram_counts = np.bincount(ids, minlength=vocab_size).astype(np.int64)
+    ids = np.asarray(ids, dtype=np.int64)
+    # a bigram (x, y) is the single number x * V + y
+    pairs, bigram_counts = np.unique(ids[:-1] * vocab_size + ids[1:], return_counts=True)
+    return unigram_counts, pairs // vocab_size, pairs % vocab_size, bigram_counts
+
+
+def _x_log_ratio(observed, expected):
+    # observed * ln(observed / expected), with 0 * ln(0) = 0
+    safe = np.where(observed > 0, observed, 1)
+    return np.where(observed > 0, observed * np.log(safe / expected), 0.0)
+
+
+def association_scores(c1, c2, c12, n):
+    """
+    PMI, t-score and log-likelihood ratio (Dunning's G2) of bigrams, vectorized.
+    c1, c2 are the counts of the two words, c12 the bigram count, n the number of tokens.
+    """
+    c1, c2, c12 = (np.asarray(c, dtype=np.float64) for c in (c1, c2, c12))
+    expected = c1 * c2 / n
+    scores = {
+        "pmi": np.log2(c12 / expected),
+        "t_score": (c12 - expected) / np.sqrt(c12),
+    }
+    # 2x2 contingency table of (first word is x?) by (second word is y?)
+    observed = (c12, c1 - c12, c2 - c12, n - c1 - c2 + c12)
+    row_col = ((c1, c2), (c1, n - c2), (n - c1, c2), (n - c1, n - c2))
+    scores["log_likelihood"] = 2 * sum(_x_log_ratio(o, r * c / n) for o, (r, c) in zip(observed, row_col))
+    return scores
+
+
+def top_collocations(ids, vocab, k=20, min_count=5):
+    """
+    The k highest-scoring bigrams for each measure in MEASURES, as lists of
+    ("x y", score, count). Bigrams seen fewer than min_count times are ignored
+    (PMI in particular overrates rare pairs).
+    """
+    unigram_counts, first, second, bigram_counts = count_unigrams_bigrams(ids, len(vocab))
+    keep = bigram_counts >= min_count
+    first, second, bigram_counts = first[keep], second[keep], bigram_counts[keep]
+    scores = association_scores(unigram_counts[first], unigram_counts[second], bigram_counts, len(ids))
+
+    results = {}
+    for measure in MEASURES:
+        values = scores[measure]
+        top = np.argpartition(-values, k)[:k] if k < len(values) else np.arange(len(values))
+        top = top[np.argsort(-values[top], kind='stable')]
+        results[measure] = [(f"{vocab[first[i]]} {vocab[second[i]]}", float(values[i]), int(bigram_counts[i]))
+                            for i in top]
+    return results
+
+
+def collocations_file(file_path, k=20, min_count=5):
+    """top_collocations of a gzipped corpus, read through the corpus cache."""
+    corpus = load_corpus(file_path)
+    return top_collocations(corpus.ids, corpus.vocab, k, min_count)
+
+
+def main():
+    # python collocations.py file.txt.gz [k] [min_count]
+    file_path = sys.argv[1]
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    min_count = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    for measure, top in collocations_file(file_path, k, min_count).items():
+        print(f"\nTop {k} bigrams by {measure}:")
+        for bigram, score, count in top:
+            print(f"  {bigram}: {score:.3f} (count: {count})")
+
+
+if __name__ == "__main__":
+    main()
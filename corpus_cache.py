@@ -0,0 +1,140 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from array import array
+
+import numpy as np
+
+from tokenizer import iter_gzip_lines, tokenize as default_tokenize
+
+CACHE_DIR_NAME = ".corpus_cache"
+# bytes hashed from each end of the file for the fingerprint
+FINGERPRINT_BLOCK = 1 << 20
+
+
+def write_vocab(vocab, path):
+    """Writes the vocabulary one token per line, line number = token id."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(vocab))
+
+
+def read_vocab(path):
+    # tokens never contain whitespace, so splitting on newlines is safe
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    return text.split('\n') if text else []
+
+
+def file_fingerprint(file_path):
+    """
+    Cheap fingerprint of a file: its size, mtime and a hash of its first and
+    last megabyte. Computing it takes milliseconds even for huge files.
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BLOCK))
+        if stat.st_size > FINGERPRINT_BLOCK:
+            f.seek(max(FINGERPRINT_BLOCK, stat.st_size - FINGERPRINT_BLOCK))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class Corpus(object):
+    """
+    A tokenized corpus: ids is a (memory mapped) uint32 array of token ids,
+    vocab[id] is the token and line k covers ids[line_offsets[k]:line_offsets[k + 1]].
+    ids_path is the .npy file ids is mapped from, for worker processes to map it too.
+    """
+
+    def __init__(self, ids, vocab, line_offsets, ids_path=None):
+        self.ids = ids
+        self.vocab = vocab
+        self.line_offsets = line_offsets
+        self.ids_path = ids_path
+
+    def __len__(self):
+        return len(self.ids)
+
+    def tokens(self):
+        """The token list, as tokenize would return it (strings shared with vocab)."""
+        vocab = self.vocab
+        return [vocab[i] for i in self.ids.tolist()]
+
+    def line_ids(self, k):
+        return self.ids[self.line_offsets[k]:self.line_offsets[k + 1]]
+
+
+def build_corpus(file_path, cache_path, tokenize=default_tokenize):
+    """
+    Tokenize a gzip file once, line by line, and write ids.npy, vocab.txt and
+    lines.npy to cache_path. Decompression runs in a background thread meanwhile.
+    """
+    print(f"building corpus cache for {file_path} ...")
+    token_ids = {}
+    ids = array('I')
+    line_offsets = array('Q', [0])
+    for line in iter_gzip_lines(file_path):
+        ids.extend([token_ids.setdefault(t, len(token_ids)) for t in tokenize(line)])
+        line_offsets.append(len(ids))
+
+    # write to a private dir next to the final place and rename, so a crash never
+    # leaves half a cache and processes building the same cache don't collide
+    tmp_path = tempfile.mkdtemp(prefix=os.path.basename(cache_path) + ".", suffix=".tmp",
+                                dir=os.path.dirname(cache_path))
+    try:
+        np.save(os.path.join(tmp_path, "ids.npy"), np.frombuffer(ids, dtype=np.uint32))
+        np.save(os.path.join(tmp_path, "lines.npy"), np.frombuffer(line_offsets, dtype=np.uint64))
+        write_vocab(list(token_ids), os.path.join(tmp_path, "vocab.txt"))
+        try:
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # another process finished the same cache first; it is just as good
+            if not os.path.isdir(cache_path):
+                raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _cache_location(file_path, cache_dir, name):
+    # (cache dir, cache path) of a file for a tokenizer name
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+    cache_path = os.path.join(cache_dir, f"{os.path.basename(file_path)}.{name}.{file_fingerprint(file_path)}")
+    return cache_dir, cache_path
+
+
+def cached_token_count(file_path, cache_dir=None, name="default"):
+    """Number of tokens of a file if its corpus cache is already built, else None. Never builds it."""
+    _, cache_path = _cache_location(file_path, cache_dir, name)
+    if not os.path.isdir(cache_path):
+        return None
+    line_offsets = np.load(os.path.join(cache_path, "lines.npy"), mmap_mode='r')
+    return int(line_offsets[-1])
+
+
+def load_corpus(file_path, cache_dir=None, tokenize=default_tokenize, name="default"):
+    """
+    Load the tokenized form of a gzip file, building it on the first call.
+    The cache is keyed by the file fingerprint and the tokenizer name, and lives
+    in .corpus_cache next to the file unless cache_dir is given. Pass a
+    different tokenize function together with its own name.
+    """
+    cache_dir, cache_path = _cache_location(file_path, cache_dir, name)
+    base_name = os.path.basename(file_path)
+    if not os.path.isdir(cache_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # drop caches of older versions of the same file, but not the builds
+        # (.tmp) or the finished cache of another process working on it
+        for entry in os.listdir(cache_dir):
+            if entry.startswith(f"{base_name}.{name}.") and not entry.endswith(".tmp") \
+                    and entry != os.path.basename(cache_path):
+                shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+        build_corpus(file_path, cache_path, tokenize)
+
+    ids_path = os.path.join(cache_path, "ids.npy")
+    return Corpus(np.load(ids_path, mmap_mode='r'),
+                  read_vocab(os.path.join(cache_path, "vocab.txt")),
+                  np.load(os.path.join(cache_path, "lines.npy"), mmap_mode='r'),
+                  ids_path)
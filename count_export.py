@@ -0,0 +1,118 @@
+import mmap
+import sys
+from bisect import bisect_left
+
+import numpy as np
+
+from corpus_cache import load_corpus
+from ngrams import NgramArrayCounts
+
+# File layout (all integers little-endian uint64):
+#   magic (8 bytes) | N | offsets[N + 1] | counts[N] | keys (UTF-8, sorted)
+# key i is keys[offsets[i]:offsets[i + 1]]
+MAGIC = b"CNTSORT1"
+
+
+def write_counts(counts, path):
+    """
+    Write a {key: count} mapping (e.g. a Counter) as a sorted binary file with
+    a few bulk writes. Sorting the strings sorts their UTF-8 bytes the same way,
+    so readers can binary-search the raw bytes.
+    """
+    items = sorted(counts.items())
+    keys = [key.encode('utf-8') for key, _ in items]
+    offsets = np.zeros(len(keys) + 1, dtype='<u8')
+    np.cumsum([len(key) for key in keys], out=offsets[1:])
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([len(keys)], dtype='<u8').tobytes())
+        f.write(offsets.tobytes())
+        f.write(np.fromiter((count for _, count in items), dtype='<u8', count=len(items)).tobytes())
+        f.write(b''.join(keys))
+
+
+class _Keys(object):
+    # sequence view of the keys as bytes, for bisect
+    def __init__(self, data, offsets, start):
+        self.data, self.offsets, self.start = data, offsets, start
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.start + int(self.offsets[i]):self.start + int(self.offsets[i + 1])]
+
+
+class CountsFile(object):
+    """
+    Memory-mapped reader for files written by write_counts. Opening reads only
+    the header; lookups binary-search the keys in place.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:8] != MAGIC:
+            raise ValueError(f"{path} is not a counts file")
+        n = int(np.frombuffer(self._data, dtype='<u8', count=1, offset=8)[0])
+        self.offsets = np.frombuffer(self._data, dtype='<u8', count=n + 1, offset=16)
+        self.counts = np.frombuffer(self._data, dtype='<u8', count=n, offset=16 + 8 * (n + 1))
+        self._keys = _Keys(self._data, self.offsets, 16 + 8 * (2 * n + 1))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def key(self, i):
+        return self._keys[i].decode('utf-8')
+
+    def get(self, key, default=0):
+        """Count of key, or default if it is not in the file."""
+        key = key.encode('utf-8')
+        i = bisect_left(self._keys, key)
+        if i < len(self) and self._keys[i] == key:
+            return int(self.counts[i])
+        return default
+
+    def __getitem__(self, key):
+        count = self.get(key, None)
+        if count is None:
+            raise KeyError(key)
+        return count
+
+    def __contains__(self, key):
+        return self.get(key, None) is not None
+
+    def prefix_range(self, prefix):
+        """Index range [lo, hi) of the keys starting with prefix."""
+        prefix = prefix.encode('utf-8')
+        # 0xFF never occurs in UTF-8, so it sorts after every key with this prefix
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + b'\xff')
+
+    def with_prefix(self, prefix):
+        """All (key, count) pairs whose key starts with prefix, in key order."""
+        lo, hi = self.prefix_range(prefix)
+        return [(self.key(i), int(self.counts[i])) for i in range(lo, hi)]
+
+    def most_common(self, k=None):
+        """(key, count) pairs by decreasing count, ties in key order."""
+        order = np.argsort(-self.counts.astype(np.int64), kind='stable')[:k]
+        return [(self.key(i), int(self.counts[i])) for i in order]
+
+    def items(self):
+        for i in range(len(self)):
+            yield self.key(i), int(self.counts[i])
+
+    def close(self):
+        self.offsets = self.counts = self._keys = None
+        self._data.close()
+
+
+def export_ngram_counts(file_path, n, out_path):
+    """Count the n-grams of a gzipped corpus (n=1 for tokens) and export them."""
+    corpus = load_corpus(file_path)
+    write_counts(dict(NgramArrayCounts(corpus.ids, corpus.vocab, n).items()), out_path)
+
+
+if __name__ == '__main__':
+    # python count_export.py english.txt.gz n out_file
+    export_ngram_counts(sys.argv[1], int(sys.argv[2]), sys.argv[3])
@@ -1,8 +1,14 @@
 import gzip
+import os
+import sys
 from collections import Counter
 
 import string
 
+# the rolling-hash probe lives in longest_ngram.py in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from longest_ngram import encode_segments, has_repeated_ngram
+
 
 def tokenize(text):
     print("in tokenize ...")
@@ -125,13 +131,6 @@ def find_segments(tokens):
     return segments
 
 
-def has_repeated_ngram(tokens, n):
-    """
-    Check if there's an n-gram of length n that appears at least twice.
-    """
-    ngram_counts = count_ngrams(tokens, n)
-    return any(freq > 1 for freq in ngram_counts.values())
-
 def process_file(file_path):
     """
     Process a gzipped input file and compute required n-gram statistics.
@@ -182,33 +181,27 @@ def find_longest_repeated_ngram_binary_search(tokens):
     max_freq = 0
 
     # Binary search on possible n-gram lengths
+    ids, bounds = encode_segments(segments)
     low, high = 2, max_length
     while low <= high:
         mid = (low + high) // 2
-        found = False
-
-        for segment in segments:
-            if len(segment) < mid:
-                continue
-            if has_repeated_ngram(segment, mid):
-                found = True
-                break
+        found = has_repeated_ngram(ids, bounds, mid)
 
         if found:
             low = mid + 1
         else:
             high = mid - 1
 
-    # Extract the longest n-gram at the final valid length
+    # Extract the longest n-gram at the final valid length. The probe counts
+    # repeats across segments, so count the n-grams of all segments together.
     if high >= 2:
+        ngram_counts = Counter()
         for segment in segments:
             if len(segment) >= high:
-                ngrams = generate_ngrams(segment, high)
-                ngram_counts = Counter(ngrams)
-                for ngram, freq in ngram_counts.items():
-                    if freq > 1:
-                        longest_ngram, max_freq = ngram, freq
-                        break
+                ngram_counts.update(generate_ngrams(segment, high))
+        ngram, freq = ngram_counts.most_common(1)[0]
+        if freq > 1:
+            longest_ngram, max_freq = ngram, freq
 
     return longest_ngram, max_freq
 
@@ -1,9 +1,15 @@
 import gzip
 import os
 import re
+import sys
 from collections import Counter
 from fpdf import FPDF
 
+# the corpus cache lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from corpus_cache import load_corpus
+from count_export import write_counts
+
 
 def read_gzip_file(file_path):
     with gzip.open(file_path, 'rt', encoding='utf-8') as f:
@@ -17,6 +23,11 @@ def tokenize(text):
     return tokens
 
 
+def load_tokens(file_path):
+    # tokenize applies per line as well, so the tokens can come from the cache
+    return load_corpus(file_path, tokenize=tokenize, name="unigrams_regex").tokens()
+
+
 def count_token_types(tokens):
     # Count the occurrences of each token type, and the total amount of occurrences
     token_counts = Counter(tokens)
@@ -32,10 +43,12 @@ def write_tokens_to_file(token_counts, original_file_path):
     # Create the new file name with "tokens_" prefix
     output_file_name = f"tokens_{name_without_extension}.txt"
 
-    # Write token counts to the file, each entry on a new line
+    # Write token counts to the file, each entry on a new line, in one bulk write
     with open(output_file_name, 'w', encoding='utf-8') as f:
-        for token, count in token_counts.items():
-            f.write(f"{token}: {count}\n")
+        f.write(''.join(f"{token}: {count}\n" for token, count in token_counts.items()))
+
+    # Sorted binary copy for downstream jobs (count_export.CountsFile reads it)
+    write_counts(token_counts, f"tokens_{name_without_extension}.cnt")
 
     print(f"Token counts written to {output_file_name}")
     return output_file_name
@@ -46,10 +59,8 @@ def main():
     # print("tokens:", tokenize(read_gzip_file("english.txt.gz")))
     print("English : ")
     file_path = "../english.txt.gz"
-    # Step 1: Read content from the gzip file
-    content = read_gzip_file(file_path)
-    # Step 2: Tokenize the content
-    tokens = tokenize(content)
+    # Step 1+2: Read and tokenize the gzip file (cached after the first run)
+    tokens = load_tokens(file_path)
     # Step 3: Count token types
     token_counts, all_tokens_count = count_token_types(tokens)
     distinct_tokens_count = len(token_counts)
@@ -63,10 +74,8 @@ def main():
     # print("tokens:", tokenize(read_gzip_file("english.txt.gz")))
     print("Hebrew : ")
     file_path = "../hebrew.txt.gz"
-    # Step 1: Read content from the gzip file
-    content = read_gzip_file(file_path)
-    # Step 2: Tokenize the content
-    tokens = tokenize(content)
+    # Step 1+2: Read and tokenize the gzip file (cached after the first run)
+    tokens = load_tokens(file_path)
     # Step 3: Count token types
     token_counts, all_tokens_count = count_token_types(tokens)
     distinct_tokens_count = len(token_counts)
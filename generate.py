@@ -1,16 +1,30 @@
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import gzip
 import random
+import struct
+import sys
+
+# sentences per chunk; each chunk has its own RNG, seeded from (seed, chunk number)
+CHUNK_SIZE = 10000
+# first bytes of a compiled grammar file
+MAGIC = b"PCFGBIN1"
 
 class PCFG(object):
     def __init__(self):
         self._rules = defaultdict(list)
         self._sums = defaultdict(float)
+        self._alias = {}
+        self._fallback = None
 
     def add_rule(self, lhs, rhs, weight):
         assert(isinstance(lhs, str))
         assert(isinstance(rhs, list))
         self._rules[lhs].append((rhs, weight))
         self._sums[lhs] += weight
+        self._alias.pop(lhs, None)
+        self._fallback = None
 
     @classmethod
     def from_file(cls, filename):
@@ -27,28 +41,301 @@ class PCFG(object):
 
     def is_terminal(self, symbol): return symbol not in self._rules
 
-    def gen(self, symbol):
-        if self.is_terminal(symbol): return symbol
-        else:
-            expansion = self.random_expansion(symbol)
-            return " ".join(self.gen(s) for s in expansion)
+    def fallback_rules(self):
+        """
+        For every nonterminal, the RHS of its shortest-terminating rule: the one
+        whose derivation tree can be the shallowest. Following these rules only
+        always ends, since every step goes to symbols of smaller height.
+        """
+        if self._fallback is not None: return self._fallback
+        height, fallback = {}, {}
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rules in self._rules.items():
+                for r,w in rules:
+                    if all(self.is_terminal(s) or s in height for s in r):
+                        h = 1 + max([height.get(s, 0) for s in r] or [0])
+                        if h < height.get(lhs, float("inf")):
+                            height[lhs], fallback[lhs] = h, r
+                            changed = True
+        self._fallback = fallback
+        return fallback
+
+    def gen(self, symbol, max_depth=None, max_length=None, rng=random):
+        """
+        Generates a random string from symbol, iteratively: an explicit stack of
+        (symbol, depth) is expanded left to right and terminals go straight into
+        one output list. Past max_depth, or once the terminals out plus the
+        symbols still pending reach max_length, nonterminals expand by their
+        shortest-terminating rule instead, so the output ends as soon as
+        possible (it can still exceed max_length by those rules' lengths).
+        """
+        out = []
+        stack = [(symbol, 0)]
+        fallback = None
+        while stack:
+            symbol, depth = stack.pop()
+            if self.is_terminal(symbol):
+                out.append(symbol)
+                continue
+            if (max_depth is not None and depth >= max_depth) or \
+                    (max_length is not None and len(out) + len(stack) >= max_length):
+                if fallback is None: fallback = self.fallback_rules()
+                if symbol not in fallback:
+                    raise ValueError("no finite derivation of %s" % symbol)
+                expansion = fallback[symbol]
+            else:
+                expansion = self.random_expansion(symbol, rng)
+            stack.extend((s, depth + 1) for s in reversed(expansion))
+        return " ".join(out)
+
+    def random_sent(self, max_depth=None, max_length=None, rng=random):
+        return self.gen("ROOT", max_depth, max_length, rng)
+
+    def compile(self):
+        """The grammar as a CompiledPCFG, for fast batch generation."""
+        return CompiledPCFG.from_pcfg(self)
+
+    def random_sent_chunks(self, n, seed=None, workers=1, max_depth=None, max_length=None):
+        """CompiledPCFG.random_sent_chunks on the compiled grammar."""
+        return self.compile().random_sent_chunks(n, seed, workers, max_depth, max_length)
+
+    def random_sents(self, n, seed=None, workers=1, max_depth=None, max_length=None):
+        """Generates n sentences with the compiled grammar (see CompiledPCFG.random_sent_chunks)."""
+        return self.compile().random_sents(n, seed, workers, max_depth, max_length)
+
+    def alias_table(self, symbol):
+        """
+        Walker's alias table for the rules of symbol, built with Vose's method:
+        (rhs, prob, alias) where rule i is kept with probability prob[i] and
+        otherwise replaced by rule alias[i]. Built on first use, dropped by add_rule.
+        """
+        table = self._alias.get(symbol)
+        if table is not None: return table
+        rules = self._rules[symbol]
+        n = len(rules)
+        scaled = [w * n / self._sums[symbol] for r,w in rules]
+        prob, alias = [1.0] * n, list(range(n))
+        small = [i for i in range(n) if scaled[i] < 1]
+        large = [i for i in range(n) if scaled[i] >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+        # whatever is left is 1 up to rounding
+        table = self._alias[symbol] = ([r for r,w in rules], prob, alias)
+        return table
+
+    def random_expansion(self, symbol, rng=random):
+        """
+        Generates a random RHS for symbol, in proportion to the weights,
+        in constant time with the alias table of symbol.
+        """
+        rhs, prob, alias = self.alias_table(symbol)
+        x = rng.random() * len(rhs)
+        i = int(x)
+        return rhs[i] if x - i < prob[i] else rhs[alias[i]]
+
+
+class CompiledPCFG(object):
+    """
+    A PCFG interned to integers, in flat arrays:
+      symbols[i]          the name of symbol i, terminal[i] is 1 for terminals
+      rule_offsets        the rules of symbol i are rule_offsets[i]:rule_offsets[i + 1]
+      rhs_offsets, rhs    the RHS of rule r is rhs[rhs_offsets[r]:rhs_offsets[r + 1]]
+      prob, alias         the alias tables of all symbols, indexed by rule
+      fallback            the shortest-terminating rule of symbol i, or -1
+    Generation samples from the same alias tables with the same draws as
+    PCFG.gen, so both give the same sentences for the same RNG state.
+    """
+
+    _INT_ARRAYS = ("rule_offsets", "rhs_offsets", "rhs", "alias", "fallback")
+
+    def __init__(self, symbols, terminal, rule_offsets, rhs_offsets, rhs, prob, alias, fallback):
+        self.symbols = symbols
+        self.index = dict((symbol, i) for i, symbol in enumerate(symbols))
+        self.terminal = terminal
+        self.rule_offsets = rule_offsets
+        self.rhs_offsets = rhs_offsets
+        self.rhs = rhs
+        self.prob = prob
+        self.alias = alias
+        self.fallback = fallback
 
-    def random_sent(self):
-        return self.gen("ROOT")
+    @classmethod
+    def from_pcfg(cls, pcfg):
+        symbols = list(pcfg._rules)
+        for rules in list(pcfg._rules.values()):
+            for r,w in rules:
+                symbols.extend(s for s in r if pcfg.is_terminal(s))
+        symbols = list(dict.fromkeys(symbols))
+        index = dict((symbol, i) for i, symbol in enumerate(symbols))
+        fallback_rules = pcfg.fallback_rules()
+
+        terminal = bytearray(len(symbols))
+        rule_offsets, rhs_offsets, rhs = array("q", [0]), array("q", [0]), array("q")
+        prob, alias, fallback = array("d"), array("q"), array("q", [-1]) * len(symbols)
+        for i, symbol in enumerate(symbols):
+            if pcfg.is_terminal(symbol):
+                terminal[i] = 1
+            else:
+                first = len(rhs_offsets) - 1
+                rules, sym_prob, sym_alias = pcfg.alias_table(symbol)
+                for j, r in enumerate(rules):
+                    if r is fallback_rules.get(symbol): fallback[i] = first + j
+                    rhs.extend(index[s] for s in r)
+                    rhs_offsets.append(len(rhs))
+                prob.extend(sym_prob)
+                alias.extend(first + a for a in sym_alias)
+            rule_offsets.append(len(rhs_offsets) - 1)
+        return cls(symbols, terminal, rule_offsets, rhs_offsets, rhs, prob, alias, fallback)
+
+    def gen(self, symbol, max_depth=None, max_length=None, rng=random):
+        """PCFG.gen on the compiled grammar."""
+        # a symbol the grammar never mentions has no rules: a terminal, as in PCFG.gen
+        if symbol not in self.index: return symbol
+        terminal, rule_offsets, rhs_offsets, rhs = self.terminal, self.rule_offsets, self.rhs_offsets, self.rhs
+        prob, alias, draw = self.prob, self.alias, rng.random
+        bounded = max_depth is not None or max_length is not None
+        out = []
+        stack, depths = [self.index[symbol]], [0]
+        while stack:
+            s = stack.pop()
+            depth = depths.pop()
+            if terminal[s]:
+                out.append(s)
+                continue
+            if bounded and ((max_depth is not None and depth >= max_depth) or
+                            (max_length is not None and len(out) + len(stack) >= max_length)):
+                r = self.fallback[s]
+                if r < 0:
+                    raise ValueError("no finite derivation of %s" % self.symbols[s])
+            else:
+                first = rule_offsets[s]
+                x = draw() * (rule_offsets[s + 1] - first)
+                r = first + int(x)
+                if x - int(x) >= prob[r]: r = alias[r]
+            expansion = rhs[rhs_offsets[r]:rhs_offsets[r + 1]]
+            expansion.reverse()
+            stack.extend(expansion)
+            depths.extend([depth + 1] * len(expansion))
+        symbols = self.symbols
+        return " ".join([symbols[s] for s in out])
+
+    def random_sent(self, max_depth=None, max_length=None, rng=random):
+        return self.gen("ROOT", max_depth, max_length, rng)
+
+    def random_sent_chunk(self, seed, chunk, size, max_depth=None, max_length=None):
+        """size sentences from the RNG stream of (seed, chunk)."""
+        rng = random.Random("%s:%d" % (seed, chunk))
+        return [self.random_sent(max_depth, max_length, rng) for _ in range(size)]
 
-    def random_expansion(self, symbol):
+    def random_sent_chunks(self, n, seed=None, workers=1, max_depth=None, max_length=None):
         """
-        Generates a random RHS for symbol, in proportion to the weights.
+        Generates n sentences as lists of up to CHUNK_SIZE, in order. Chunk i is
+        drawn from its own RNG seeded with (seed, i), so the output for a seed
+        is the same whatever the number of workers. With workers > 1 the
+        compiled grammar is sent once to each process of a pool.
         """
-        p = random.random() * self._sums[symbol]
-        for r,w in self._rules[symbol]:
-            p = p - w
-            if p < 0: return r
-        return r
+        if seed is None: seed = random.randrange(2 ** 63)
+        sizes = [min(CHUNK_SIZE, n - start) for start in range(0, n, CHUNK_SIZE)]
+        if workers <= 1 or len(sizes) <= 1:
+            for chunk, size in enumerate(sizes):
+                yield self.random_sent_chunk(seed, chunk, size, max_depth, max_length)
+            return
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self,)) as pool:
+            args = [(seed, chunk, size, max_depth, max_length) for chunk, size in enumerate(sizes)]
+            for sents in pool.map(_gen_chunk, args):
+                yield sents
+
+    def random_sents(self, n, seed=None, workers=1, max_depth=None, max_length=None):
+        """Generates n sentences (see random_sent_chunks)."""
+        for sents in self.random_sent_chunks(n, seed, workers, max_depth, max_length):
+            for sent in sents:
+                yield sent
+
+    def save(self, filename):
+        """
+        Writes the grammar as MAGIC, the array lengths, the arrays (little-endian)
+        and the symbol names, one per line.
+        """
+        arrays = [getattr(self, name) for name in self._INT_ARRAYS] + [self.prob]
+        with open(filename, "wb") as fh:
+            fh.write(MAGIC)
+            fh.write(struct.pack("<%dq" % (len(arrays) + 1), len(self.symbols), *[len(a) for a in arrays]))
+            fh.write(bytes(self.terminal))
+            for a in arrays:
+                if sys.byteorder == "big": a = array(a.typecode, a); a.byteswap()
+                fh.write(a.tobytes())
+            fh.write("\n".join(self.symbols).encode("utf-8"))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                raise ValueError("%s is not a compiled grammar" % filename)
+            names = cls._INT_ARRAYS + ("prob",)
+            lengths = struct.unpack("<%dq" % (len(names) + 1), fh.read(8 * (len(names) + 1)))
+            terminal = bytearray(fh.read(lengths[0]))
+            arrays = {}
+            for name, length in zip(names, lengths[1:]):
+                a = array("d" if name == "prob" else "q")
+                a.frombytes(fh.read(8 * length))
+                if sys.byteorder == "big": a.byteswap()
+                arrays[name] = a
+            symbols = fh.read().decode("utf-8").split("\n")
+        return cls(symbols, terminal, **arrays)
+
+
+def load_grammar(filename):
+    """A CompiledPCFG from a compiled grammar file or a text grammar."""
+    with open(filename, "rb") as fh:
+        compiled = fh.read(len(MAGIC)) == MAGIC
+    return CompiledPCFG.load(filename) if compiled else PCFG.from_file(filename).compile()
+
+
+# the grammar of a pool worker, sent once by the initializer
+_worker_grammar = None
+
+def _init_worker(grammar):
+    global _worker_grammar
+    _worker_grammar = grammar
+
+def _gen_chunk(args):
+    return _worker_grammar.random_sent_chunk(*args)
+
+
+def write_sents(grammar, out, n, seed=None, workers=1, max_depth=None, max_length=None):
+    """Writes n sentences to out, one per line, a chunk per write."""
+    for sents in grammar.random_sent_chunks(n, seed, workers, max_depth, max_length):
+        out.write("\n".join(sents) + "\n")
 
 
 if __name__ == '__main__':
 
-    import sys
-    pcfg = PCFG.from_file(sys.argv[1])
-    print(pcfg.random_sent())
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate random sentences from a PCFG.")
+    parser.add_argument("grammar", help="text grammar or compiled grammar file")
+    parser.add_argument("-n", type=int, default=1, help="number of sentences (default 1)")
+    parser.add_argument("--seed", help="seed; the same seed gives the same sentences for any --workers")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-depth", type=int)
+    parser.add_argument("--max-length", type=int)
+    parser.add_argument("-o", "--output", help="output file, gzipped if it ends in .gz (default stdout)")
+    parser.add_argument("--compile", metavar="FILE", help="save the compiled grammar to FILE and exit")
+    args = parser.parse_args()
+
+    pcfg = load_grammar(args.grammar)
+    if args.compile:
+        pcfg.save(args.compile)
+        sys.exit()
+    if args.output is None:
+        out = sys.stdout
+    elif args.output.endswith(".gz"):
+        out = gzip.open(args.output, "wt", encoding="utf-8")
+    else:
+        out = open(args.output, "w", encoding="utf-8", buffering=1 << 20)
+    write_sents(pcfg, out, args.n, args.seed, args.workers, args.max_depth, args.max_length)
+    if out is not sys.stdout: out.close()
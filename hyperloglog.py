@@ -0,0 +1,126 @@
+import sys
+from hashlib import blake2b
+from itertools import islice
+
+import numpy as np
+
+from parallel import iter_map_files
+from tokenizer import iter_gzip_tokens
+
+DEFAULT_PRECISION = 14
+# tokens hashed per vectorized register update (duplicates in a batch are hashed once)
+BATCH_SIZE = 1 << 16
+
+
+def hash_tokens(tokens):
+    """64-bit hashes of tokens as a uint64 array. blake2b is stable across processes, unlike hash()."""
+    return np.fromiter((int.from_bytes(blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+                        for token in tokens), dtype=np.uint64)
+
+
+def _bit_length(values):
+    # exact bit length of uint64 values, by binary search on the shift
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= np.uint64(1 << shift)
+        lengths[high] += shift
+        values[high] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+
+class HyperLogLog(object):
+    """
+    HyperLogLog sketch (Flajolet et al. 2007) of the number of distinct tokens,
+    in 2 ** precision one-byte registers (16 KiB at the default precision).
+    Sketches of the same precision merge losslessly, so shards can be sketched
+    separately. The relative standard error is 1.04 / sqrt(2 ** precision).
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    def add_hashes(self, hashes):
+        """Add 64-bit hashes: the top bits pick a register, which keeps the longest run of leading zeros seen."""
+        if not len(hashes):
+            return
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        ranks = (rest_bits + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, ranks)
+
+    def update(self, tokens):
+        """Add the tokens of an iterable (e.g. a streamed file) in batches."""
+        tokens = iter(tokens)
+        while True:
+            batch = set(islice(tokens, BATCH_SIZE))
+            if not batch:
+                break
+            self.add_hashes(hash_tokens(batch))
+
+    def add(self, token):
+        self.add_hashes(hash_tokens([token]))
+
+    def merge(self, other):
+        """Union in place with a sketch of the same precision."""
+        if other.precision != self.precision:
+            raise ValueError(f"cannot merge precision {other.precision} into {self.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self):
+        return HyperLogLog(self.precision, self.registers.copy())
+
+    def estimate(self):
+        """Estimated number of distinct tokens, with linear counting for small cardinalities."""
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return float(m * np.log(m / zeros))
+        return float(raw)
+
+    @property
+    def relative_error(self):
+        return 1.04 / len(self.registers) ** 0.5
+
+    def estimate_with_error(self):
+        """(estimate, standard error), both in types."""
+        estimate = self.estimate()
+        return estimate, estimate * self.relative_error
+
+    def __len__(self):
+        return int(round(self.estimate()))
+
+    def to_bytes(self):
+        return bytes([self.precision]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data[0], np.frombuffer(data, dtype=np.uint8, offset=1).copy())
+
+
+def sketch_file(file_path, precision=DEFAULT_PRECISION):
+    """HyperLogLog of the tokens of a gzipped file, streamed."""
+    sketch = HyperLogLog(precision)
+    sketch.update(iter_gzip_tokens(file_path))
+    return sketch
+
+
+def sketch_files(file_paths, precision=DEFAULT_PRECISION, workers=None):
+    """One merged sketch of many shards, each sketched in the process pool."""
+    merged = HyperLogLog(precision)
+    for sketch in iter_map_files(sketch_file, file_paths, workers):
+        merged.merge(sketch)
+    return merged
+
+
+if __name__ == '__main__':
+    # python hyperloglog.py shard.gz [shard.gz ...]
+    estimate, error = sketch_files(sys.argv[1:]).estimate_with_error()
+    print(f"Distinct types: ~{estimate:.0f} (± {error:.0f})")
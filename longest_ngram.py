@@ -1,22 +1,11 @@
 import gzip
+import sys
 from collections import Counter
-from tqdm import tqdm
-import string
 
-
-def tokenize(text):
-   # print("in tokenize ...")
-    # Define all punctuation to strip, including UTF-8 general punctuation
-    utf8_general_punctuation = "".join([chr(i) for i in range(8192, 8303)])
-    punctuation = utf8_general_punctuation + string.punctuation
-
-    tokens = []
-    for token in text.split():
-        stripped_token = token.strip(punctuation)
-        if stripped_token:
-            tokens.append(stripped_token)
-
-    return tokens
+from corpus_cache import load_corpus
+from parallel import map_files
+from suffix_array import longest_repeated_ngram_ids
+from tokenizer import tokenize
 
 
 def generate_ngrams(tokens, n):
@@ -63,30 +52,74 @@ def find_all_segments(tokens, min_freq=2):
     return segments
 
 
+# 64-bit polynomial rolling hash over token ids
+HASH_BASE = 1000003
+HASH_MASK = (1 << 64) - 1
+
+
+def encode_segments(segments):
+    """
+    Map the tokens of all segments to integer ids in one flat list.
+    Returns (ids, bounds) with bounds[k] = (start, end) of segment k in ids.
+    """
+    token_ids = {}
+    ids = []
+    bounds = []
+    for segment in segments:
+        start = len(ids)
+        ids.extend(token_ids.setdefault(token, len(token_ids)) for token in segment)
+        bounds.append((start, len(ids)))
+    return ids, bounds
+
+
+def has_repeated_ngram(ids, bounds, n):
+    """
+    Check if some n-gram appears at least twice. Windows never cross a segment
+    boundary, but the two occurrences may be in different segments.
+    The hash of each window is rolled forward in O(1), so a probe is O(len(ids)),
+    stopping at the first duplicate. Equal hashes are verified on the ids, so a
+    collision never gives a false answer.
+    """
+    if n == 0:
+        return bool(bounds)
+    # weight of the token leaving the window
+    top = pow(HASH_BASE, n - 1, 1 << 64)
+    seen = {}  # hash -> start of the first window with that hash
+    collided = {}  # hash -> starts of other windows sharing it (rare)
+    for start, end in bounds:
+        if end - start < n:
+            continue
+        h = 0
+        for t in ids[start:start + n]:
+            h = (h * HASH_BASE + t + 1) & HASH_MASK
+        for i in range(start, end - n + 1):
+            if i > start:
+                h = ((h - (ids[i - 1] + 1) * top) * HASH_BASE + ids[i + n - 1] + 1) & HASH_MASK
+            first = seen.get(h)
+            if first is None:
+                seen[h] = i
+                continue
+            window = ids[i:i + n]
+            others = collided.setdefault(h, [])
+            if any(ids[j:j + n] == window for j in [first] + others):
+                return True
+            others.append(i)
+    return False
+
+
 def find_longest_ngram(tokens):
     segments = find_all_segments(tokens, 2)  # extracting all optional segments
     max_length = max(len(segment) for segment in segments)  # max len of segments #TODO count
     print("max optional n:", max_length)
+    ids, bounds = encode_segments(segments)
     left, right = 0, max_length
     longest_ngram = ""
     longest_freq = 0
     while left <= right:
         mid = (left + right) // 2
         print("mid is :", mid)
-        seen_ngrams = set()
-        found = False
-        for segment in segments:  #
-            for i in range(len(segment) - mid + 1):
-                ngram = (segment[i:i + mid])
-                # seen_ngrams[ngram] += 1
-                if ngram in seen_ngrams:
-                    left = mid + 1
-                    found = True
-                    break
-                else:
-                    seen_ngrams.add(ngram)
-            if found:
-                break
+        if has_repeated_ngram(ids, bounds, mid):
+            left = mid + 1
         else:
             right = mid - 1
     #  for segements in len more than right all segments len right counter and then most common
@@ -114,17 +147,16 @@ def process_file(file_path):
     """
     Process a gzipped input file and compute required n-gram statistics.
     """
-    print("start read ...")
-    text = read_gzip_file(file_path)
-    print("finish read ...")
-
-    # Tokenize text
-    print("start tokenize ...")
-    tokens = tokenize(text)
-    print("finished tokenize ...")
+    # Tokenized once and cached, later runs just map the token ids
+    print("start load corpus ...")
+    corpus = load_corpus(file_path)
+    print("finished load corpus ...")
 
     print("start longest repeated ngram ...")
-    longest_ngram, freq = find_longest_ngram(tokens)
+    # suffix array + LCP engine over the whole token stream, O(n log n). Unlike
+    # find_longest_ngram it counts repeated whole segments every time they occur
+    # and breaks length ties by count, then earliest occurrence.
+    longest_ngram, freq, _ = longest_repeated_ngram_ids(corpus.ids, corpus.vocab)
 
     print("finished longest repeated ngram ...")
     results = {"Longest n-gram": (longest_ngram, freq)}
@@ -150,16 +182,14 @@ def print_results(results):
         print("-" * 40)
 
 
-def main():
+def main(workers=None, memory_limit_mb=None):
     # Define input files (compressed .gz files)
     input_files = ["hebrew.txt.gz"]  # , "english.txt.gz"]  # Replace with your actual .gz file paths
 
-    # Process each file
-    all_results = {}
+    # Process the files in parallel, one process per file
     print("start process ...")
-
-    for file_path in tqdm(input_files, desc="Processing files"):
-        all_results[file_path] = process_file(file_path)
+    results = map_files(process_file, input_files, workers, memory_limit_mb)
+    all_results = dict(zip(input_files, results))
     print("finish process ...")
 
     # Print results
@@ -168,4 +198,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # python longest_ngram.py [workers] [memory limit per file in MB]
+    main(*[int(arg) for arg in sys.argv[1:3]])
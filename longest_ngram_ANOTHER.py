@@ -1,22 +1,9 @@
 import gzip
 from collections import Counter
 from tqdm import tqdm
-import string
 
-
-def tokenize(text):
-    print("in tokenize ...")
-    # Define all punctuation to strip, including UTF-8 general punctuation
-    utf8_general_punctuation = "".join([chr(i) for i in range(8192, 8303)])
-    punctuation = utf8_general_punctuation + string.punctuation
-
-    tokens = []
-    for token in text.split():
-        stripped_token = token.strip(punctuation)
-        if stripped_token:
-            tokens.append(stripped_token)
-
-    return tokens
+from suffix_array import longest_repeated_ngram
+from tokenizer import iter_gzip_tokens, tokenize
 
 
 def generate_ngrams(tokens, n):
@@ -64,43 +51,21 @@ def find_all_segments(tokens, min_freq=2):
 
 def longest_ngram_with_freq(tokens, min_freq=2):
     """
-    Find the longest n-gram that appears at least `min_freq` times using index-based splitting.
+    Find the longest n-gram that appears at least `min_freq` times.
+    Uses the suffix array engine (sliding-window minima over the LCP array), so
+    it is near-linear in the corpus size for any min_freq.
+    Returns (ngram, length); see longest_ngram_occurrences for count and positions.
+    """
+    longest_ngram, _, _ = longest_ngram_occurrences(tokens, min_freq)
+    return longest_ngram, len(longest_ngram) if longest_ngram else 0
+
+
+def longest_ngram_occurrences(tokens, min_freq=2):
     """
-    ngram_to_indices = {}
-    max_length = 0
-    longest_ngram = None
-
-    # Initialize with unigrams
-    for i, token in enumerate(tokens):
-        ngram = (token,)
-        if ngram not in ngram_to_indices:
-            ngram_to_indices[ngram] = []
-        ngram_to_indices[ngram].append(i)
-
-    # Iteratively extend n-grams
-    current_length = 1
-    while ngram_to_indices:
-        next_ngram_to_indices = {}
-
-        for ngram, indices in ngram_to_indices.items():
-            # Filter n-grams by frequency
-            if len(indices) >= min_freq:
-                if current_length > max_length:
-                    max_length = current_length
-                    longest_ngram = ngram
-
-                # Extend the n-gram
-                for idx in indices:
-                    if idx + current_length < len(tokens):
-                        extended_ngram = ngram + (tokens[idx + current_length],)  # הרחבה כ-tuple
-                        if extended_ngram not in next_ngram_to_indices:
-                            next_ngram_to_indices[extended_ngram] = []
-                        next_ngram_to_indices[extended_ngram].append(idx)
-
-        ngram_to_indices = next_ngram_to_indices
-        current_length += 1
-
-    return longest_ngram, max_length
+    Longest n-gram appearing at least `min_freq` times, with its count and
+    the sorted start positions of all its occurrences.
+    """
+    return longest_repeated_ngram(tokens, min_freq)
 
 
 def read_gzip_file(file_path):
@@ -115,13 +80,9 @@ def process_file(file_path):
     """
     Process a gzipped input file and compute required n-gram statistics.
     """
-    print("start read ...")
-    text = read_gzip_file(file_path)
-    print("finish read ...")
-
-    # Tokenize text
+    # Read and tokenize line by line, the whole text is never held in memory
     print("start tokenize ...")
-    tokens = tokenize(text)
+    tokens = list(iter_gzip_tokens(file_path))
     print("finished tokenize ...")
 
     print("start longest repeated ngram ...")
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+from corpus_cache import load_corpus, read_vocab, write_vocab
+from ngrams import count_ngram_ids
+
+
+def build_index(file_path, index_dir, max_order=5):
+    """
+    Count the 1..max_order-grams of a gzipped file once and write them as a
+    sorted, memory-mappable index to index_dir.
+    For every order n there is {n}-grams.npy (the n-grams stored column by
+    column, rows in lexicographic order of token ids) and {n}-counts.npy.
+    """
+    print("start build index ...")
+    corpus = load_corpus(file_path)
+    ids, vocab = corpus.ids, corpus.vocab
+    os.makedirs(index_dir, exist_ok=True)
+    write_vocab(vocab, os.path.join(index_dir, "vocab.txt"))
+
+    for n in range(1, max_order + 1):
+        print(f"indexing {n}-grams ...")
+        ngrams, counts, _ = count_ngram_ids(ids, n)
+        # one contiguous array per column keeps every binary search step on
+        # a plain slice of the memory map
+        np.save(os.path.join(index_dir, f"{n}-grams.npy"), np.ascontiguousarray(ngrams.T))
+        np.save(os.path.join(index_dir, f"{n}-counts.npy"), counts.astype(np.uint32))
+
+    with open(os.path.join(index_dir, "meta.json"), 'w') as f:
+        json.dump({"source": os.path.basename(file_path), "max_order": max_order, "tokens": len(ids)}, f)
+    print("finished build index ...")
+
+
+class NgramIndex(object):
+    """
+    Read-only view of an index written by build_index. Arrays are memory
+    mapped, so opening is instant and only the searched pages are read.
+    """
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.max_order = self.meta["max_order"]
+        self.vocab = read_vocab(os.path.join(index_dir, "vocab.txt"))
+        self.token_ids = {token: i for i, token in enumerate(self.vocab)}
+        self._columns = {}
+        self._counts = {}
+        for n in range(1, self.max_order + 1):
+            self._columns[n] = np.load(os.path.join(index_dir, f"{n}-grams.npy"), mmap_mode='r')
+            self._counts[n] = np.load(os.path.join(index_dir, f"{n}-counts.npy"), mmap_mode='r')
+
+    def _encode(self, ngram):
+        if isinstance(ngram, str):
+            ngram = ngram.split()
+        ids = [self.token_ids.get(token) for token in ngram]
+        return None if None in ids else ids
+
+    def _range(self, n, key):
+        """
+        Rows [lo, hi) of the order-n table whose first len(key) ids equal key.
+        Rows sharing a prefix are sorted by the next column, so each column is
+        searched only inside the range left by the previous one.
+        """
+        columns = self._columns[n]
+        lo, hi = 0, columns.shape[1]
+        for j, token_id in enumerate(key):
+            column = columns[j, lo:hi]
+            lo, hi = lo + np.searchsorted(column, token_id, 'left'), lo + np.searchsorted(column, token_id, 'right')
+            if lo == hi:
+                break
+        return int(lo), int(hi)
+
+    def count(self, ngram):
+        """Count of an n-gram given as a string or a list of tokens (0 if unseen)."""
+        key = self._encode(ngram)
+        if not key or len(key) > self.max_order:
+            return 0
+        lo, hi = self._range(len(key), key)
+        return int(self._counts[len(key)][lo]) if lo < hi else 0
+
+    def continuations(self, prefix):
+        """
+        All (token, count) pairs that follow the (n-1)-gram prefix, in token id order.
+        """
+        lo, hi = self._prefix_range(prefix)
+        if lo == hi:
+            return []
+        n = self._order(prefix)
+        last = self._columns[n][n - 1, lo:hi]
+        counts = self._counts[n][lo:hi]
+        return [(self.vocab[t], int(c)) for t, c in zip(last, counts)]
+
+    def top_k(self, prefix, k=10):
+        """
+        The k most frequent continuations of prefix as (token, count) pairs.
+        An empty prefix gives the top k unigrams.
+        """
+        lo, hi = self._prefix_range(prefix)
+        if lo == hi:
+            return []
+        n = self._order(prefix)
+        counts = np.asarray(self._counts[n][lo:hi])
+        # stable sort so equal counts stay in token id order
+        order = np.argsort(-counts.astype(np.int64), kind='stable')[:k]
+        last = self._columns[n][n - 1, lo:hi]
+        return [(self.vocab[last[i]], int(counts[i])) for i in order]
+
+    def _order(self, prefix):
+        return len(prefix.split() if isinstance(prefix, str) else prefix) + 1
+
+    def _prefix_range(self, prefix):
+        n = self._order(prefix)
+        if n > self.max_order:
+            raise ValueError(f"prefix longer than {self.max_order - 1} tokens")
+        key = self._encode(prefix)
+        if key is None:
+            return 0, 0
+        return self._range(n, key)
+
+
+if __name__ == '__main__':
+    # python ngram_index.py build english.txt.gz english.idx [max_order]
+    # python ngram_index.py query english.idx "prefix tokens" [k]
+    if sys.argv[1] == "build":
+        build_index(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else 5)
+    else:
+        index = NgramIndex(sys.argv[2])
+        for token, count in index.top_k(sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else 10):
+            print(f"{token}: {count}")
@@ -0,0 +1,163 @@
+import math
+import os
+import sys
+
+import numpy as np
+
+from corpus_cache import load_corpus, read_vocab, write_vocab
+from ngrams import count_ngram_ids
+from tokenizer import tokenize
+
+# number of levels the log-scores are quantized to (stored as uint8)
+QUANT_LEVELS = 256
+
+
+def trie_keys(history, words, base):
+    """
+    Keys of m-grams in the trie: the index of the (m-1)-gram history in the
+    sorted keys of order m-1, times the vocabulary size, plus the last word id.
+    Keys of lexicographically sorted m-grams come out sorted.
+    """
+    return history.astype(np.uint64) * np.uint64(base) + words.astype(np.uint64)
+
+
+def find_keys(sorted_keys, keys):
+    """Index of each key in a sorted key array, -1 where it is missing."""
+    if not len(sorted_keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    found = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[found] == keys, found, -1)
+
+
+def quantize(scores):
+    """
+    Quantize log-scores to uint8 codes with a uniform codebook over their range.
+    Returns (codes, codebook) with codebook[code] the value the code stands for.
+    """
+    lo = float(scores.min()) if len(scores) else 0.0
+    codebook = np.linspace(lo, 0.0, QUANT_LEVELS).astype(np.float32)
+    step = -lo / (QUANT_LEVELS - 1) if lo < 0 else 1.0
+    codes = np.rint((scores - lo) / step).astype(np.uint8)
+    return codes, codebook
+
+
+class StupidBackoffLM(object):
+    """
+    N-gram language model with stupid backoff (Brants et al. 2007):
+    S(w | h) = c(h w) / c(h) if the n-gram was seen, else alpha * S(w | shorter h),
+    down to c(w) / total tokens for unigrams.
+    Every order is a level of a sorted-array trie: unigrams are keyed by word id,
+    and an m-gram by its history's index in order m-1 and its last word
+    (see trie_keys), with one quantized log10 score per entry. Key ranges are
+    bounded by #(m-1)-grams * |V| rather than |V| ** m.
+    """
+
+    def __init__(self, vocab, order, alpha, keys, codes, codebooks, total):
+        self.vocab = vocab
+        self.token_ids = {token: i for i, token in enumerate(vocab)}
+        self.order = order
+        self.alpha = alpha
+        self.keys = keys
+        self.codes = codes
+        self.codebooks = codebooks
+        self.total = total
+        # an unknown word scores like a singleton unigram, plus the backoff
+        # penalties of the orders usable at its position
+        self.unknown_score = math.log10(1 / max(total, 1))
+
+    @classmethod
+    def build(cls, ids, vocab, order=3, alpha=0.4):
+        """Count orders 1..order of the token id array and build the model."""
+        base = len(vocab)
+        keys, codes, codebooks = {}, {}, {}
+        previous_counts = None
+        for m in range(1, order + 1):
+            rows, counts, _ = count_ngram_ids(ids, m)
+            if m == 1:
+                keys[m] = rows[:, 0].astype(np.uint64)
+                scores = np.log10(counts / len(ids))
+            else:
+                if len(keys[m - 1]) * base >= 2 ** 64:
+                    raise ValueError(f"too many {m - 1}-grams for a vocabulary of {base} types")
+                # index of the (m-1)-gram history: walk the trie down its words
+                history = find_keys(keys[1], rows[:, 0].astype(np.uint64))
+                for j in range(1, m - 1):
+                    history = find_keys(keys[j + 1], trie_keys(history, rows[:, j], base))
+                keys[m] = trie_keys(history, rows[:, -1], base)
+                scores = np.log10(counts / previous_counts[history])
+            previous_counts = counts
+            codes[m], codebooks[m] = quantize(scores)
+        return cls(vocab, order, alpha, keys, codes, codebooks, len(ids))
+
+    @classmethod
+    def from_file(cls, file_path, order=3, alpha=0.4):
+        corpus = load_corpus(file_path)
+        return cls.build(corpus.ids, corpus.vocab, order, alpha)
+
+    def save(self, model_dir):
+        os.makedirs(model_dir, exist_ok=True)
+        write_vocab(self.vocab, os.path.join(model_dir, "vocab.txt"))
+        arrays = {"meta": np.array([self.order, self.total]), "alpha": np.array([self.alpha])}
+        for m in range(1, self.order + 1):
+            arrays[f"keys{m}"] = self.keys[m]
+            arrays[f"codes{m}"] = self.codes[m]
+            arrays[f"codebook{m}"] = self.codebooks[m]
+        np.savez(os.path.join(model_dir, "model.npz"), **arrays)
+
+    @classmethod
+    def load(cls, model_dir):
+        vocab = read_vocab(os.path.join(model_dir, "vocab.txt"))
+        with np.load(os.path.join(model_dir, "model.npz")) as arrays:
+            order, total = (int(v) for v in arrays["meta"])
+            orders = range(1, order + 1)
+            return cls(vocab, order, float(arrays["alpha"][0]),
+                       {m: arrays[f"keys{m}"] for m in orders},
+                       {m: arrays[f"codes{m}"] for m in orders},
+                       {m: arrays[f"codebook{m}"] for m in orders},
+                       total)
+
+    def score(self, sentences):
+        """
+        log10 stupid-backoff score of each sentence (a string or a token list),
+        as a float array. All sentences are scored together with array lookups.
+        """
+        unknown = len(self.vocab)
+        ids, sentence_of, position = [], [], []
+        for s, sentence in enumerate(sentences):
+            tokens = tokenize(sentence) if isinstance(sentence, str) else sentence
+            ids.extend(self.token_ids.get(token, unknown) for token in tokens)
+            sentence_of.extend([s] * len(tokens))
+            position.extend(range(len(tokens)))
+        ids = np.array(ids, dtype=np.int64)
+        sentence_of = np.array(sentence_of, dtype=np.int64)
+        position = np.array(position, dtype=np.int64)
+
+        # highest order usable at each position (the history stops at the sentence start)
+        top_order = np.minimum(position + 1, self.order)
+        log_alpha = math.log10(self.alpha)
+        scores = self.unknown_score + (top_order - 1) * log_alpha
+
+        # index[p] is the trie index of the m-gram ending at position p (-1 if
+        # unseen); an m-gram extends the (m-1)-gram ending one position earlier.
+        # Every order seen overrides the lower ones, leaving the highest.
+        # Unknown words (id len(vocab)) are not in order 1; they must not reach
+        # trie_keys either, where they would alias the next history's keys.
+        index = find_keys(self.keys[1], ids.astype(np.uint64))
+        known = index >= 0
+        for m in range(1, self.order + 1):
+            if m > 1:
+                at = np.flatnonzero((top_order >= m) & known)
+                at = at[previous[at - 1] >= 0]
+                index = np.full(len(ids), -1, dtype=np.int64)
+                index[at] = find_keys(self.keys[m], trie_keys(previous[at - 1], ids[at], len(self.vocab)))
+            at = np.flatnonzero(index >= 0)
+            scores[at] = self.codebooks[m][self.codes[m][index[at]]] + (top_order[at] - m) * log_alpha
+            previous = index
+
+        return np.bincount(sentence_of, weights=scores, minlength=len(sentences))
+
+
+if __name__ == '__main__':
+    # python ngram_lm.py english.txt.gz model_dir [order]
+    lm = StupidBackoffLM.from_file(sys.argv[1], int(sys.argv[3]) if len(sys.argv) > 3 else 3)
+    lm.save(sys.argv[2])
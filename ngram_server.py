@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from ngram_index import NgramIndex
+
+# latencies kept per operation for the percentiles
+LATENCY_WINDOW = 10000
+# longest request line the server accepts
+MAX_REQUEST_BYTES = 1 << 24
+
+
+class NgramServer(object):
+    """
+    Serves one NgramIndex to many local clients over a Unix domain socket.
+    The protocol is one JSON object per line each way:
+      {"op": "count", "ngrams": ["a b", ...]}            -> {"counts": [...]}
+      {"op": "top_k", "prefixes": ["a", ...], "k": 10}   -> {"results": [[[token, count], ...], ...]}
+      {"op": "stats"}                                    -> per-op request count and latency percentiles
+    Errors come back as {"error": "..."}.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.requests = defaultdict(int)
+
+    def handle(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+        op = request.get("op")
+        if op == "count":
+            return {"counts": [self.index.count(ngram) for ngram in request["ngrams"]]}
+        if op == "top_k":
+            k = request.get("k", 10)
+            return {"results": [self.index.top_k(prefix, k) for prefix in request["prefixes"]]}
+        if op == "stats":
+            return {"stats": self.stats()}
+        raise ValueError(f"unknown op {op!r}")
+
+    def stats(self):
+        """Request count and p50/p90/p99 latency in ms for each operation."""
+        stats = {}
+        for op, latencies in self.latencies.items():
+            p50, p90, p99 = np.percentile(np.array(latencies), [50, 90, 99]) * 1000
+            stats[op] = {"requests": self.requests[op], "p50_ms": p50, "p90_ms": p90, "p99_ms": p99}
+        return stats
+
+    async def _serve_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # longer than MAX_REQUEST_BYTES: the rest of the line can't be
+                    # told apart from the next request, so answer and hang up
+                    writer.write(json.dumps({"error": f"request longer than {MAX_REQUEST_BYTES} bytes"})
+                                 .encode('utf-8') + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                start = time.perf_counter()
+                try:
+                    request = json.loads(line)
+                    response = self.handle(request)
+                    op = request["op"]
+                    self.requests[op] += 1
+                    self.latencies[op].append(time.perf_counter() - start)
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"error": str(e)}
+                writer.write(json.dumps(response).encode('utf-8') + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(self._serve_client, socket_path, limit=MAX_REQUEST_BYTES)
+        print(f"serving on {socket_path} ...")
+        async with server:
+            await server.serve_forever()
+
+
+class NgramClient(object):
+    """Blocking client for NgramServer. Send many n-grams per call to save round trips."""
+
+    def __init__(self, socket_path):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._file = self._socket.makefile('rwb')
+
+    def _call(self, request):
+        self._file.write(json.dumps(request).encode('utf-8') + b"\n")
+        self._file.flush()
+        response = json.loads(self._file.readline())
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response
+
+    def count(self, ngrams):
+        """Counts of a batch of n-grams (strings or token lists)."""
+        return self._call({"op": "count", "ngrams": list(ngrams)})["counts"]
+
+    def top_k(self, prefixes, k=10):
+        """Top k continuations of each prefix as lists of (token, count)."""
+        results = self._call({"op": "top_k", "prefixes": list(prefixes), "k": k})["results"]
+        return [[tuple(pair) for pair in result] for result in results]
+
+    def stats(self):
+        return self._call({"op": "stats"})["stats"]
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    # python ngram_server.py index_dir socket_path
+    asyncio.run(NgramServer(NgramIndex(sys.argv[1])).serve(sys.argv[2]))
@@ -1,22 +1,15 @@
 import gzip
+import os
+import sys
+import tempfile
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
-import string
+import numpy as np
 
-
-def tokenize(text):
-    print("in tokenize ...")
-    # Define all punctuation to strip, including UTF-8 general punctuation
-    utf8_general_punctuation = "".join([chr(i) for i in range(8192, 8303)])
-    punctuation = utf8_general_punctuation + string.punctuation
-
-    tokens = []
-    for token in text.split():
-        stripped_token = token.strip(punctuation)
-        if stripped_token:
-            tokens.append(stripped_token)
-
-    return tokens
+from corpus_cache import load_corpus
+from parallel import chunk_bounds, default_workers, map_files
+from tokenizer import tokenize
 
 
 def generate_ngrams(tokens, n):
@@ -28,18 +21,269 @@ def generate_ngrams(tokens, n):
     return [' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
 
 
-def count_ngrams(tokens, n):
+def count_ngrams(tokens, n, engine="counter"):
     print("in count_ngrams ...")
 
     """
     Count the frequencies of n-grams in the token list.
+    engine="numpy" counts with array operations and returns an NgramArrayCounts.
     """
+    if engine == "numpy":
+        ids, vocab = encode_tokens(tokens)
+        return NgramArrayCounts(ids, vocab, n)
+
     print("start generate ...")
     ngrams = generate_ngrams(tokens, n)
     ngram_counts = Counter(ngrams)
     return ngram_counts
 
 
+# state of the worker processes of count_ngram_windows_parallel: the mapped
+# ids, n and the directory of the shared position and hash files
+_chunk_ids = None
+_chunk_n = None
+_chunk_dir = None
+
+
+def _init_chunk_worker(ids_path, n, work_dir):
+    global _chunk_ids, _chunk_n, _chunk_dir
+    _chunk_ids = np.load(ids_path, mmap_mode='r')
+    _chunk_n = n
+    _chunk_dir = work_dir
+
+
+def _shared(name, mode='r'):
+    return np.load(os.path.join(_chunk_dir, name), mmap_mode=mode)
+
+
+def _hash_chunk(args):
+    """
+    Stage 1: hash the windows starting at start..end-1 (the last one reads n-1
+    ids past `end`), order them by hash bucket and write their positions and
+    hashes to the same range of the shared files. Returns the bucket sizes.
+    """
+    start, end, bits = args
+    hashes = hash_windows(_chunk_ids[start:end + _chunk_n - 1], _chunk_n)
+    buckets = (hashes >> np.uint64(64 - bits)).astype(np.intp)
+    order = np.argsort(buckets, kind='stable')
+    positions, shared_hashes = _shared("positions.npy", 'r+'), _shared("hashes.npy", 'r+')
+    positions[start:end] = order + start
+    shared_hashes[start:end] = hashes[order]
+    positions.flush()
+    shared_hashes.flush()
+    return np.bincount(buckets, minlength=1 << bits)
+
+
+def _count_bucket(slices):
+    """
+    Stage 2: count the windows of one hash bucket, read from its slice of every
+    chunk. Equal n-grams have equal hashes, so the bucket holds whole groups.
+    """
+    positions, hashes = _shared("positions.npy"), _shared("hashes.npy")
+    first, counts, _ = _group_windows(_chunk_ids, _chunk_n,
+                                      np.concatenate([positions[lo:hi] for lo, hi in slices]),
+                                      np.concatenate([hashes[lo:hi] for lo, hi in slices]))
+    return first, counts
+
+
+def count_ngram_windows_parallel(ids_path, n, workers=None):
+    """
+    count_ngram_windows of the ids in a .npy file, in a process pool. Workers
+    map the file rather than receive a copy. In a first stage every worker
+    hashes a chunk of windows and sorts it by hash bucket (the top bits of the
+    hash) into shared files; in the second every worker counts whole buckets,
+    so all windows of an n-gram meet in one worker and nothing is regrouped in
+    this process. The results only have to be put back in first-occurrence
+    order, which is done by scattering into an array rather than sorting.
+    """
+    ids = np.load(ids_path, mmap_mode='r')
+    workers = workers or default_workers()
+    total = len(ids) - n + 1
+    if workers == 1 or total < workers * 4:
+        return count_ngram_windows(ids, n)
+
+    # a few chunks and buckets per worker keeps the pool busy when they run unevenly
+    bounds = chunk_bounds(total, workers * 4)
+    bits = (workers * 4 - 1).bit_length()
+    with tempfile.TemporaryDirectory() as work_dir:
+        np.lib.format.open_memmap(os.path.join(work_dir, "positions.npy"), 'w+', np.int64, (total,))
+        np.lib.format.open_memmap(os.path.join(work_dir, "hashes.npy"), 'w+', np.uint64, (total,))
+        with ProcessPoolExecutor(workers, initializer=_init_chunk_worker, initargs=(ids_path, n, work_dir)) as pool:
+            sizes = list(pool.map(_hash_chunk, [(start, end, bits) for start, end in bounds]))
+            offsets = [np.r_[0, np.cumsum(chunk_sizes)] + start for chunk_sizes, (start, _) in zip(sizes, bounds)]
+            slices = [[(chunk[k], chunk[k + 1]) for chunk in offsets] for k in range(1 << bits)]
+            parts = list(pool.map(_count_bucket, slices))
+
+    # first positions are distinct, so placing the counts at them orders the n-grams
+    counts_at = np.zeros(total, dtype=np.int64)
+    for first, counts in parts:
+        counts_at[first] = counts
+    first = np.flatnonzero(counts_at)
+    return first, counts_at[first]
+
+
+def count_ngrams_parallel(tokens, n, workers=None):
+    print("in count_ngrams_parallel ...")
+
+    """
+    Count the frequencies of n-grams in the token list using a process pool
+    (see count_ngram_windows_parallel). Returns an NgramArrayCounts.
+    """
+    ids, vocab = encode_tokens(tokens)
+    with tempfile.TemporaryDirectory() as work_dir:
+        ids_path = os.path.join(work_dir, "ids.npy")
+        np.save(ids_path, ids)
+        counted = count_ngram_windows_parallel(ids_path, n, workers)
+    return NgramArrayCounts(ids, vocab, n, counted)
+
+
+def encode_tokens(tokens):
+    """
+    Map tokens to a uint32 id array, ids given in order of first occurrence.
+    Returns (ids, vocab) where vocab[id] is the token. tokens may be a generator.
+    """
+    index = {}
+    count = len(tokens) if hasattr(tokens, '__len__') else -1
+    ids = np.fromiter((index.setdefault(t, len(index)) for t in tokens), dtype=np.uint32, count=count)
+    return ids, list(index)
+
+
+# odd 64-bit multiplier (golden ratio) for hash_windows
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def hash_windows(ids, n):
+    """
+    64-bit hash of every window of n ids, one vectorized pass per column:
+    each id is xored in, then the state is multiplied and its high bits folded
+    down (uint64 arithmetic wraps).
+    """
+    m = len(ids) - n + 1
+    hashes = np.zeros(m, dtype=np.uint64)
+    for j in range(n):
+        hashes ^= ids[j:j + m].astype(np.uint64)
+        hashes *= HASH_MULTIPLIER
+        hashes ^= hashes >> np.uint64(32)
+    return hashes
+
+
+def count_ngram_windows(ids, n):
+    """
+    Count the n-grams of an id array by hashing every window to one uint64 and
+    sorting the hashes once, instead of sorting on all n columns.
+    Returns (first, counts): the position of the first occurrence of every
+    distinct n-gram, in increasing order (Counter order), and its count.
+    """
+    ids = np.asarray(ids)
+    if len(ids) < n:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    first, counts, _ = _group_windows(ids, n, np.arange(len(ids) - n + 1), hash_windows(ids, n))
+    return first, counts
+
+
+def _group_windows(ids, n, positions, hashes, weights=None):
+    """
+    Group the windows of ids starting at `positions` by their hashes and sum
+    their weights (1 each by default). Every window that shares its hash with
+    an earlier one in sorted order is compared with its group's first window,
+    and groups with a collision are split by their actual ids.
+    Returns (first, counts, hashes) per distinct n-gram, by first position.
+    """
+    if not len(positions):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    order = np.argsort(hashes)
+    positions, hashes = positions[order], hashes[order]
+    if weights is not None:
+        weights = weights[order]
+    is_start = np.r_[True, hashes[1:] != hashes[:-1]]
+    group = np.cumsum(is_start) - 1
+    # singletons (most windows for large n) have nothing to compare against
+    repeated = np.flatnonzero(~is_start)
+    if len(repeated):
+        window, reference = positions[repeated], positions[is_start][group[repeated]]
+        mismatch = np.zeros(len(repeated), dtype=bool)
+        for j in range(n):
+            mismatch |= ids[window + j] != ids[reference + j]
+
+        if mismatch.any():
+            # re-sort the members of colliding groups by hash, then by their ids
+            members = np.isin(group, np.unique(group[repeated[mismatch]]))
+            member_positions = positions[members]
+            keys = [ids[member_positions + j] for j in range(n - 1, -1, -1)] + [hashes[members]]
+            regrouped = np.lexsort(keys)
+            positions[members] = member_positions[regrouped]
+            if weights is not None:
+                weights[members] = weights[members][regrouped]
+            windows = np.lib.stride_tricks.sliding_window_view(ids, n)[positions[members]]
+            is_start[members] = np.r_[True, np.any(windows[1:] != windows[:-1], axis=1)]
+
+    starts = np.flatnonzero(is_start)
+    counts = np.diff(np.r_[starts, len(positions)]) if weights is None else np.add.reduceat(weights, starts)
+    first = np.minimum.reduceat(positions, starts)
+    by_position = np.argsort(first)
+    return first[by_position], counts[by_position], hashes[starts][by_position]
+
+
+def count_ngram_ids(ids, n):
+    """
+    Count the n-grams of an id array with array operations.
+    Returns (ngrams, counts, first): the distinct n-grams as rows of ids in
+    lexicographic order, their counts and the position of their first occurrence.
+    """
+    if len(ids) < n:
+        return np.empty((0, n), dtype=np.uint32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    windows = np.lib.stride_tricks.sliding_window_view(ids, n)
+    # lexsort uses the last key as the primary one, so pass the columns reversed.
+    # It is stable, so each run of equal rows starts at the earliest position.
+    order = np.lexsort(windows.T[::-1])
+    rows = windows[order]
+    starts = np.flatnonzero(np.r_[True, np.any(rows[1:] != rows[:-1], axis=1)])
+    counts = np.diff(np.r_[starts, len(rows)])
+    return rows[starts], counts, order[starts]
+
+
+class NgramArrayCounts(object):
+    """
+    Counter-like result of the numpy engine. Keys are the same space-joined
+    strings count_ngrams produces, built only for the entries asked for.
+    Entries are kept in order of first occurrence, like a Counter.
+    """
+
+    def __init__(self, ids, vocab, n, counted=None):
+        self.ids = ids
+        self.vocab = vocab
+        self.n = n
+        # counted: (first, counts) already computed, e.g. by count_ngram_windows_parallel
+        self.first, self.counts = counted if counted is not None else count_ngram_windows(ids, n)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _key(self, i):
+        start = self.first[i]
+        return ' '.join(self.vocab[t] for t in self.ids[start:start + self.n])
+
+    def most_common(self, k=None):
+        """
+        Same as Counter.most_common: by count, ties broken by first occurrence.
+        """
+        if k is not None and k <= 0:
+            return []
+        candidates = np.arange(len(self.counts))
+        if k is not None and k < len(candidates):
+            # only entries at least as frequent as the k-th largest count can make it
+            kth = np.partition(self.counts, len(self.counts) - k)[len(self.counts) - k]
+            candidates = np.flatnonzero(self.counts >= kth)
+        # entries are in first-occurrence order, so a stable sort breaks the ties
+        order = candidates[np.argsort(-self.counts[candidates], kind='stable')][:k]
+        return [(self._key(i), int(self.counts[i])) for i in order]
+
+    def items(self):
+        for i in range(len(self.counts)):
+            yield self._key(i), int(self.counts[i])
+
+
 def find_longest_repeated_ngram(tokens):
     print("in longest repeated ngrams ...")
 
@@ -104,22 +348,28 @@ def read_gzip_file(file_path):
         return f.read()
 
 
-def process_file(file_path):
+def process_file(file_path, workers=None, engine="numpy"):
     """
     Process a gzipped input file and compute required n-gram statistics.
+    engine is "numpy" (array counting in this process) or "parallel" (the same
+    counting in `workers` processes, default: all cores).
     """
-    print("start read ...")
-    text = read_gzip_file(file_path)
-    print("finish read ...")
-
-    # Tokenize text
-    print("start tokenize ...")
-    tokens = tokenize(text)
-    print("finised tokenize ...")
-    results = {
-         "5-grams": count_ngrams(tokens, 5).most_common(10),
-         "10-grams": count_ngrams(tokens, 10).most_common(10),
-    }
+    # Tokenized once and cached, later runs just map the token ids
+    print("start load corpus ...")
+    corpus = load_corpus(file_path)
+    print("finished load corpus ...")
+    if engine == "numpy":
+        results = {
+             "5-grams": NgramArrayCounts(corpus.ids, corpus.vocab, 5).most_common(10),
+             "10-grams": NgramArrayCounts(corpus.ids, corpus.vocab, 10).most_common(10),
+        }
+    else:
+        results = {
+             "5-grams": NgramArrayCounts(corpus.ids, corpus.vocab, 5,
+                                         count_ngram_windows_parallel(corpus.ids_path, 5, workers)).most_common(10),
+             "10-grams": NgramArrayCounts(corpus.ids, corpus.vocab, 10,
+                                          count_ngram_windows_parallel(corpus.ids_path, 10, workers)).most_common(10),
+        }
    # print("start longest repeated ngram ...")
    # longest_ngram, freq = find_longest_repeated_ngram(tokens)
    # print("finished longest repeated ngram ...")
@@ -145,16 +395,18 @@ def print_results(results):
         print("-" * 40)
 
 
-def main():
+def main(workers=None, memory_limit_mb=None, engine="numpy"):
     # Define input files (compressed .gz files)
     input_files = ["hebrew.txt.gz","english.txt.gz"]  # Replace with your actual .gz file paths
 
-    # Process each file
-    all_results = {}
     print("start process ...")
-
-    for file_path in input_files:
-        all_results[file_path] = process_file(file_path)
+    if engine == "parallel":
+        # one file at a time, each counted by all workers (memory_limit_mb is per file process only)
+        results = [process_file(file_path, workers, engine) for file_path in input_files]
+    else:
+        # Process the files in parallel, one process per file
+        results = map_files(process_file, input_files, workers, memory_limit_mb)
+    all_results = dict(zip(input_files, results))
     print("finish process ...")
 
     # Print results
@@ -162,4 +414,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # python ngrams.py [workers] [memory limit per file in MB] [engine: numpy | parallel]
+    main(*[int(arg) for arg in sys.argv[1:3]], *sys.argv[3:4])
@@ -0,0 +1,85 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # not available on Windows, memory limits are skipped there
+    resource = None
+
+
+def default_workers():
+    """Number of worker processes to use when none is given."""
+    return os.cpu_count() or 1
+
+
+def chunk_bounds(length, chunks):
+    """
+    Split range(length) into at most `chunks` consecutive (start, end) pairs of
+    (almost) equal size.
+    """
+    chunks = max(1, min(chunks, length))
+    size, extra = divmod(length, chunks)
+    bounds = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def tree_merge_counters(counters):
+    """
+    Merge partial Counters pairwise as a balanced tree, consuming them as they
+    arrive: like a binary counter, two merged results of the same level are
+    merged again, so only O(log n) partial Counters are alive at any time.
+    The right Counter is always merged into the left one, which keeps the
+    insertion order of the first-seen keys, so most_common() breaks ties the
+    same way as a single Counter would.
+    """
+    stack = []  # (level, counter), levels strictly decreasing towards the top
+    for counter in counters:
+        level = 0
+        while stack and stack[-1][0] == level:
+            _, left = stack.pop()
+            left.update(counter)
+            counter = left
+            level += 1
+        stack.append((level, counter))
+
+    if not stack:
+        return Counter()
+    merged = stack[0][1]
+    for _, counter in stack[1:]:
+        merged.update(counter)
+    return merged
+
+
+def _limit_memory(memory_limit_mb):
+    if resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def iter_map_files(func, file_paths, workers=None, memory_limit_mb=None):
+    """
+    Run func(file_path) for every file in a process pool and yield the results
+    in the order of file_paths, as soon as each one is ready. memory_limit_mb
+    caps the address space of each worker, so a file that needs more fails
+    with MemoryError in its own process.
+    """
+    workers = min(workers or default_workers(), len(file_paths))
+    if workers <= 1 and memory_limit_mb is None:
+        for file_path in file_paths:
+            yield func(file_path)
+        return
+
+    initializer, initargs = (_limit_memory, (memory_limit_mb,)) if memory_limit_mb else (None, ())
+    with ProcessPoolExecutor(max(workers, 1), initializer=initializer, initargs=initargs) as pool:
+        yield from pool.map(func, file_paths)
+
+
+def map_files(func, file_paths, workers=None, memory_limit_mb=None):
+    """Same as iter_map_files, returning the results as a list."""
+    return list(iter_map_files(func, file_paths, workers, memory_limit_mb))
@@ -0,0 +1,243 @@
+from array import array
+
+import numpy as np
+
+from ngrams import encode_tokens
+
+
+def build_suffix_array(ids):
+    """
+    Suffix array of a token id sequence by prefix doubling: every round sorts
+    the suffixes by the ranks of their first k and next k tokens, until all
+    ranks are distinct. O(n log n) per round, a handful of int64 arrays of size n.
+    Any ids work: they are first replaced by their dense rank, so every rank
+    stays below n and the combined sort key never collides.
+    """
+    n = len(ids)
+    rank = np.unique(np.asarray(ids, dtype=np.int64), return_inverse=True)[1].reshape(-1)
+    sa = np.argsort(rank, kind='stable')
+    k = 1
+    while n > 1:
+        # rank of the suffix k tokens ahead, 0 when it runs past the end
+        second = np.zeros(n, dtype=np.int64)
+        second[:n - k] = rank[k:] + 1
+        key = rank * (n + 1) + second
+        sa = np.argsort(key, kind='stable')
+        key = key[sa]
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = np.cumsum(np.r_[False, key[1:] != key[:-1]])
+        if rank[sa[-1]] == n - 1 or k >= n:
+            break
+        k *= 2
+    return sa
+
+
+def build_lcp(ids, sa):
+    """
+    Kasai's algorithm: lcp[i] is the length of the common prefix of the
+    suffixes sa[i-1] and sa[i] (lcp[0] = 0). Runs on compact int arrays
+    rather than lists to keep memory at 8 bytes per token.
+    """
+    n = len(sa)
+    text = array('q', np.asarray(ids, dtype=np.int64).tobytes())
+    order = array('q', np.asarray(sa, dtype=np.int64).tobytes())
+    rank = array('q', bytes(8 * n))
+    for i, p in enumerate(order):
+        rank[p] = i
+
+    lcp = array('q', bytes(8 * n))
+    h = 0
+    for p in range(n):
+        r = rank[p]
+        if r == 0:
+            h = 0
+            continue
+        q = order[r - 1]
+        while p + h < n and q + h < n and text[p + h] == text[q + h]:
+            h += 1
+        lcp[r] = h
+        # the suffix starting one token later shares at least h-1 tokens
+        if h:
+            h -= 1
+    return np.frombuffer(lcp, dtype=np.int64)
+
+
+def sliding_window_min(values, width):
+    """
+    Minimum of every window of `width` consecutive values, O(n) for any width
+    (van Herk / Gil-Werman): cut the array into blocks of `width`, take running
+    minima forwards and backwards inside each block, and every window is the
+    min of one backward and one forward running minimum.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    n = len(values)
+    if width > n:
+        return np.empty(0, dtype=np.int64)
+    blocks = -(-n // width)
+    padded = np.full(blocks * width, np.iinfo(np.int64).max)
+    padded[:n] = values
+    padded = padded.reshape(blocks, width)
+    forward = np.minimum.accumulate(padded, axis=1).ravel()
+    backward = np.minimum.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.minimum(backward[:n - width + 1], forward[width - 1:n])
+
+
+class SuffixArray(object):
+    """
+    Suffix array and LCP array over a token id sequence.
+    """
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids)
+        self.sa = build_suffix_array(self.ids)
+        self.lcp = build_lcp(self.ids, self.sa)
+
+    def intervals(self, length):
+        """
+        Suffix array ranges [lo, hi] of the n-grams of `length` tokens that occur
+        at least twice: maximal runs of suffixes sharing `length` tokens.
+        """
+        shared = np.r_[False, self.lcp[1:] >= length, False]
+        edges = np.flatnonzero(shared[1:] != shared[:-1])
+        # a run of lcp values at i..j means suffixes sa[i-1..j] share the prefix
+        return edges[0::2], edges[1::2]
+
+    def longest_repeat(self, min_count=2):
+        """
+        Longest n-gram occurring at least min_count times.
+        Returns (length, positions), positions being the sorted start positions
+        of all its occurrences, or (0, []) if no n-gram occurs that often.
+        When several n-grams have that length the most frequent (then earliest) wins.
+        Near-linear for any min_count: one sliding-window minimum over the LCP array.
+        """
+        if min_count <= 1:
+            return (len(self.ids), [0]) if len(self.ids) else (0, [])
+        # min_count suffixes next to each other share min(lcp) tokens over the
+        # min_count-1 lcp values between them
+        window_min = sliding_window_min(self.lcp[1:], min_count - 1)
+        length = int(window_min.max()) if len(window_min) else 0
+        if length == 0:
+            return 0, []
+
+        lo, hi = self.intervals(length)
+        counts = hi - lo + 1
+        # earliest occurrence of each run: minimum of sa[lo..hi] with one reduceat
+        bounds = np.column_stack((lo, hi + 1)).ravel()
+        first = np.minimum.reduceat(np.r_[self.sa, 0], bounds)[::2]
+        keep = np.flatnonzero(counts >= min_count)
+        best = keep[np.lexsort((first[keep], -counts[keep]))[0]]
+        return length, sorted(self.sa[lo[best]:hi[best] + 1].tolist())
+
+    def lcp_intervals(self):
+        """
+        Yield (length, lo, hi) for every lcp-interval: a maximal suffix array
+        range [lo, hi] whose suffixes share exactly `length` > 0 tokens. These are
+        the right-maximal repeats. One bottom-up pass with a stack, O(n).
+        """
+        lcp = self.lcp.tolist()
+        n = len(lcp)
+        stack = [(0, 0)]
+        for i in range(1, n + 1):
+            current = lcp[i] if i < n else 0
+            lo = i - 1
+            while current < stack[-1][0]:
+                length, lo = stack.pop()
+                yield length, lo, i - 1
+            if current > stack[-1][0]:
+                stack.append((current, lo))
+
+    def maximal_repeats(self, min_length=2, order="length"):
+        """
+        Yield every maximal repeat (an n-gram occurring at least twice that can
+        not be extended left or right without losing an occurrence) of at least
+        min_length tokens as (length, count, positions).
+        order="length" gives the longest first, order="count" the most frequent first.
+        Only (length, count, range) triples are kept for sorting; positions are
+        read from the suffix array as each repeat is yielded.
+        """
+        if order not in ("length", "count"):
+            raise ValueError("order must be 'length' or 'count'")
+        # token before each suffix, -1 for the suffix starting the text.
+        # A range is left-maximal unless all its suffixes have the same real token before them.
+        left = np.where(self.sa > 0, self.ids[self.sa - 1].astype(np.int64), -1)
+        left_changes = np.r_[0, np.cumsum(left[1:] != left[:-1])]
+
+        repeats = []
+        for length, lo, hi in self.lcp_intervals():
+            if length < min_length:
+                continue
+            if left_changes[hi] == left_changes[lo] and left[lo] != -1:
+                continue
+            repeats.append((length, hi - lo + 1, lo))
+
+        if order == "length":
+            repeats.sort(key=lambda r: (-r[0], -r[1], r[2]))
+        else:
+            repeats.sort(key=lambda r: (-r[1], -r[0], r[2]))
+        for length, count, lo in repeats:
+            yield length, count, sorted(self.sa[lo:lo + count].tolist())
+
+
+def longest_repeated_ngram(tokens, min_count=2):
+    """
+    Longest n-gram of the token list occurring at least min_count times.
+    Returns (ngram, count, positions) with the n-gram as a tuple of tokens,
+    or (None, 0, []) if nothing repeats.
+    """
+    ids, vocab = encode_tokens(tokens)
+    return longest_repeated_ngram_ids(ids, vocab, min_count)
+
+
+def longest_repeated_ngram_ids(ids, vocab, min_count=2):
+    """Same as longest_repeated_ngram for an already encoded token id array."""
+    length, positions = SuffixArray(ids).longest_repeat(min_count)
+    if not positions:
+        return None, 0, []
+    start = positions[0]
+    ngram = tuple(vocab[i] for i in ids[start:start + length])
+    return ngram, len(positions), positions
+
+
+def iter_maximal_repeats(tokens, min_length=2, order="length"):
+    """
+    Yield (ngram, count, positions) for every maximal repeated phrase of the
+    token list with at least min_length tokens, from a single suffix array build.
+    """
+    ids, vocab = encode_tokens(tokens)
+    for length, count, positions in SuffixArray(ids).maximal_repeats(min_length, order):
+        start = positions[0]
+        yield tuple(vocab[i] for i in ids[start:start + length]), count, positions
+
+
+def check_against_brute_force(trials=300, seed=0):
+    """
+    Compare the suffix array, LCP array and longest_repeat with brute force on
+    small random id sequences, including sparse ids far above the length.
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        n = int(rng.integers(0, 40))
+        ids = rng.choice(rng.integers(0, 10 ** 6, size=int(rng.integers(1, 6))), size=n)
+        text = ids.tolist()
+        suffix_array = SuffixArray(ids)
+        assert suffix_array.sa.tolist() == sorted(range(n), key=lambda p: text[p:])
+        for i in range(1, n):
+            a, b = text[suffix_array.sa[i - 1]:], text[suffix_array.sa[i]:]
+            shared = next((j for j, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+            assert suffix_array.lcp[i] == shared
+
+        min_count = int(rng.integers(2, 5))
+        length, positions = suffix_array.longest_repeat(min_count)
+        occurrences = {}
+        for m in range(1, n + 1):
+            for p in range(n - m + 1):
+                occurrences.setdefault(tuple(text[p:p + m]), []).append(p)
+        lengths = [len(gram) for gram, found in occurrences.items() if len(found) >= min_count]
+        assert length == max(lengths, default=0)
+        if length:
+            assert positions == occurrences[tuple(text[positions[0]:positions[0] + length])]
+    print(f"{trials} random sequences match brute force")
+
+
+if __name__ == '__main__':
+    check_against_brute_force()
@@ -0,0 +1,114 @@
+import gzip
+import queue
+import string
+import threading
+
+# All punctuation to strip, including UTF-8 general punctuation (U+2000..U+206E).
+# Built once at import instead of on every tokenize call.
+PUNCTUATION = "".join([chr(i) for i in range(8192, 8303)]) + string.punctuation
+_PUNCTUATION_SET = frozenset(PUNCTUATION)
+
+# characters per decompressed block, and how many blocks may wait in the queue
+BLOCK_SIZE = 1 << 20
+QUEUE_SIZE = 8
+
+
+def strip_words(words):
+    """
+    Strip punctuation from both ends of each word and drop the words that were
+    only punctuation. Most words have none at either end, so those skip strip().
+    """
+    stripped = [word if word[0] not in _PUNCTUATION_SET and word[-1] not in _PUNCTUATION_SET
+                else word.strip(PUNCTUATION)
+                for word in words]
+    return list(filter(None, stripped))
+
+
+def tokenize(text):
+    """Splits text on whitespace and strips punctuation from each token."""
+    return strip_words(text.split())
+
+
+def iter_tokens(lines):
+    """
+    Generator version of tokenize over an iterable of lines. Gives exactly the
+    same tokens, since line breaks are whitespace anyway.
+    """
+    for line in lines:
+        yield from strip_words(line.split())
+
+
+def iter_gzip_blocks(file_path, block_size=BLOCK_SIZE, queue_size=QUEUE_SIZE):
+    """
+    Yield the decompressed text of a gzip file in blocks of block_size characters.
+    A background thread decompresses ahead into a bounded queue, so decompression
+    (zlib releases the GIL) overlaps with whatever consumes the blocks.
+    """
+    blocks = queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def reader():
+        try:
+            with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+                while not stop.is_set():
+                    block = f.read(block_size)
+                    blocks.put(block)  # '' marks the end of the file
+                    if not block:
+                        return
+        except Exception as e:
+            blocks.put(e)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            block = blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                return
+            yield block
+    finally:
+        # the consumer may stop early: unblock the reader and let it finish
+        stop.set()
+        while thread.is_alive():
+            try:
+                blocks.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
+
+
+def iter_block_lines(blocks):
+    """
+    Split text blocks into lines (without the newline). A line, and so a word,
+    cut by a block boundary is held back until the block that completes it.
+    """
+    pending = []
+    for block in blocks:
+        pending.append(block)
+        if '\n' not in block:
+            continue
+        lines = ''.join(pending).split('\n')
+        pending = [lines.pop()]
+        yield from lines
+    rest = ''.join(pending)
+    if rest:
+        yield rest
+
+
+def iter_gzip_lines(file_path):
+    """Lines of a gzip file, decompressed by the pipelined block reader."""
+    return iter_block_lines(iter_gzip_blocks(file_path))
+
+
+def iter_gzip_tokens(file_path, pipelined=True):
+    """
+    Tokenizes a gzip file without loading the whole text. By default the file is
+    decompressed in a background thread while the tokens are consumed;
+    pipelined=False reads it line by line in the calling thread.
+    """
+    if pipelined:
+        yield from iter_tokens(iter_gzip_lines(file_path))
+        return
+    with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+        yield from iter_tokens(f)
@@ -0,0 +1,78 @@
+import glob
+import os
+import sys
+from collections import Counter
+
+from parallel import iter_map_files, tree_merge_counters
+from tokenizer import iter_gzip_tokens
+
+
+def shard_stats(counts):
+    """Total tokens, distinct types and tokens per type of a Counter, as analyze_file reports them."""
+    total = sum(counts.values())
+    return {
+        "total_tokens": total,
+        "distinct_types": len(counts),
+        "tokens_per_type": total / len(counts) if counts else 0.0,
+    }
+
+
+def count_shard(file_path):
+    """Map step: unigram counts of one gzipped shard, streamed, with its stats."""
+    counts = Counter(iter_gzip_tokens(file_path))
+    return shard_stats(counts), counts
+
+
+def shard_paths(paths):
+    """Expand directories (to their *.gz files) and glob patterns into a sorted list of shards."""
+    shards = []
+    for path in paths:
+        if os.path.isdir(path):
+            shards.extend(sorted(glob.glob(os.path.join(path, "*.gz"))))
+        else:
+            shards.extend(sorted(glob.glob(path)) or [path])
+    return shards
+
+
+def count_shards(file_paths, workers=None, memory_limit_mb=None):
+    """
+    Map-reduce unigram count over many shards. Every shard is counted in the
+    process pool; the partial Counters are merged in a tree as they come back,
+    in shard order, so only a logarithmic number of them is held at a time and
+    the result (including most_common() tie order) equals counting the shards
+    one after another.
+    Returns (per-shard stats in shard order, merged Counter).
+    """
+    per_shard = []
+
+    def partial_counts():
+        for stats, counts in iter_map_files(count_shard, file_paths, workers, memory_limit_mb):
+            per_shard.append(stats)
+            yield counts
+
+    counts = tree_merge_counters(partial_counts())
+    return per_shard, counts
+
+
+def main(paths, workers=None, memory_limit_mb=None):
+    file_paths = shard_paths(paths)
+    per_shard, counts = count_shards(file_paths, workers, memory_limit_mb)
+
+    print(f"{'shard':<40} {'tokens':>12} {'types':>10} {'tokens/type':>12}")
+    for file_path, stats in zip(file_paths, per_shard):
+        print(f"{os.path.basename(file_path):<40} {stats['total_tokens']:>12} "
+              f"{stats['distinct_types']:>10} {stats['tokens_per_type']:>12.3f}")
+
+    stats = shard_stats(counts)
+    print(f"\nAll {len(file_paths)} shards:")
+    print(f"1. Total tokens: {stats['total_tokens']}")
+    print(f"2. Distinct types: {stats['distinct_types']}")
+    print(f"3. Tokens/Types: {stats['tokens_per_type']}")
+    print(f"\nTop 50 tokens:")
+    for token, count in counts.most_common(50):
+        print(f"{token}: {count}")
+
+
+if __name__ == "__main__":
+    # python unigram_shards.py shard_dir_or_glob [workers] [memory limit per shard in MB]
+    main([sys.argv[1]], *[int(arg) for arg in sys.argv[2:4]])
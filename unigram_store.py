@@ -0,0 +1,165 @@
+import json
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+from corpus_cache import file_fingerprint
+from count_export import CountsFile, write_counts
+from tokenizer import iter_gzip_tokens
+from unigrams_final import DEFAULT_BUCKET_EDGES, spectrum_buckets
+
+# segments allowed before add_counts compacts them into one
+MAX_SEGMENTS = 8
+
+
+class UnigramStore(object):
+    """
+    Persistent unigram counts that grow one batch at a time, stored in store_dir:
+      segment-NNNNNN.cnt   count files (count_export format); a type's count is
+                           the sum over the segments
+      meta.json            total tokens, the frequency spectrum (types per
+                           count), the segment list and the ingested files
+    Adding a batch writes one new segment and updates the totals and the
+    spectrum from the batch's own types only, so ingestion costs as much as the
+    new data, not the whole store. Segments are merged by compact().
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        meta_path = os.path.join(store_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        else:
+            meta = {"total_tokens": 0, "spectrum": {}, "segments": [], "next_segment": 0, "files": {}}
+        self.total_tokens = meta["total_tokens"]
+        self.spectrum = Counter({int(count): types for count, types in meta["spectrum"].items()})
+        self.segment_names = meta["segments"]
+        self.next_segment = meta["next_segment"]
+        self.files = meta["files"]
+        self.segments = [CountsFile(os.path.join(store_dir, name)) for name in self.segment_names]
+
+    @property
+    def distinct_types(self):
+        return sum(self.spectrum.values())
+
+    def count(self, token):
+        return sum(segment.get(token) for segment in self.segments)
+
+    def __getitem__(self, token):
+        return self.count(token)
+
+    def stats(self):
+        """Totals in analyze_file's terms."""
+        distinct = self.distinct_types
+        return {
+            "total_tokens": self.total_tokens,
+            "distinct_types": distinct,
+            "tokens_per_type": self.total_tokens / distinct if distinct else 0.0,
+        }
+
+    def buckets(self, edges=DEFAULT_BUCKET_EDGES):
+        """bucket_counts of the whole store, straight from the stored spectrum."""
+        frequencies = np.array(sorted(self.spectrum), dtype=np.int64)
+        return spectrum_buckets(frequencies, [self.spectrum[f] for f in frequencies.tolist()], edges)
+
+    def add_counts(self, counts):
+        """Add a batch of {token: count} as a new segment."""
+        counts = {token: count for token, count in counts.items() if count > 0}
+        if not counts:
+            self._write_meta()
+            return
+        # every type of the batch moves from its old count to old + new in the spectrum
+        old = Counter()
+        for token, count in counts.items():
+            previous = self.count(token)
+            if previous:
+                old[previous] += 1
+            self.spectrum[previous + count] += 1
+        self.spectrum.subtract(old)
+        self.spectrum = +self.spectrum
+        self.total_tokens += sum(counts.values())
+
+        name = f"segment-{self.next_segment:06d}.cnt"
+        self.next_segment += 1
+        write_counts(counts, os.path.join(self.store_dir, name))
+        self.segment_names.append(name)
+        self.segments.append(CountsFile(os.path.join(self.store_dir, name)))
+        self._write_meta()
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+
+    def add_file(self, file_path):
+        """
+        Count a gzipped file into the store. A file whose fingerprint was already
+        ingested is skipped. Returns True if the file was added.
+        """
+        fingerprint = file_fingerprint(file_path)
+        if fingerprint in self.files:
+            return False
+        counts = Counter(iter_gzip_tokens(file_path))
+        self.files[fingerprint] = os.path.abspath(file_path)
+        self.add_counts(counts)
+        return True
+
+    def compact(self):
+        """Merge all segments into one."""
+        if len(self.segments) <= 1:
+            return
+        merged = Counter()
+        for segment in self.segments:
+            merged.update(dict(segment.items()))
+        name = f"segment-{self.next_segment:06d}.cnt"
+        self.next_segment += 1
+        write_counts(merged, os.path.join(self.store_dir, name))
+
+        old_names = self.segment_names
+        self.close()
+        self.segment_names = [name]
+        self.segments = [CountsFile(os.path.join(self.store_dir, name))]
+        self._write_meta()
+        for old_name in old_names:
+            os.remove(os.path.join(self.store_dir, old_name))
+
+    def _write_meta(self):
+        meta = {
+            "total_tokens": self.total_tokens,
+            "spectrum": {str(count): types for count, types in sorted(self.spectrum.items())},
+            "segments": self.segment_names,
+            "next_segment": self.next_segment,
+            "files": self.files,
+        }
+        # write and rename, so a crash leaves the previous state (new segments are just unused)
+        tmp_path = os.path.join(self.store_dir, "meta.json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.store_dir, "meta.json"))
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+
+def main():
+    # python unigram_store.py store_dir [new_file.gz ...]
+    store = UnigramStore(sys.argv[1])
+    for file_path in sys.argv[2:]:
+        added = store.add_file(file_path)
+        print(f"{file_path}: {'added' if added else 'already in the store'}")
+
+    stats = store.stats()
+    print(f"\n1. Total tokens: {stats['total_tokens']}")
+    print(f"2. Distinct types: {stats['distinct_types']}")
+    print(f"3. Tokens/Types: {stats['tokens_per_type']}")
+    print(f"\nFrequency Spectrum:")
+    for bucket, count in store.buckets():
+        print(f"{bucket}: {count}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
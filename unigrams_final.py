@@ -1,8 +1,18 @@
 import gzip
 import os
 import re
+import sys
 from collections import Counter, defaultdict
-import string
+from functools import partial
+from itertools import islice
+
+import numpy as np
+
+from corpus_cache import cached_token_count, load_corpus
+from hyperloglog import DEFAULT_PRECISION, HyperLogLog
+from parallel import map_files
+from tokenizer import iter_gzip_tokens, tokenize
+from vocab_growth import every_checkpoints, fit_heaps, growth_curve, log_checkpoints
 
 def read_gzip_file(file_path):
     """Reads a gzip file and returns its text content."""
@@ -10,59 +20,95 @@ def read_gzip_file(file_path):
         return f.read()
 
 
-def tokenize(text):
-    # Define all punctuation to strip, including UTF-8 general punctuation
-    utf8_general_punctuation = "".join([chr(i) for i in range(8192, 8303)])
-    punctuation = utf8_general_punctuation + string.punctuation
-
-    tokens = []
-    for token in text.split():
-        stripped_token = token.strip(punctuation)
-        if stripped_token:
-            tokens.append(stripped_token)
-
-    return tokens
-
 def count_token_types(tokens):
     """Counts occurrences of each token."""
     return Counter(tokens)
 
 
-def analyze_file(file_path):
-    """Analyzes token counts, splits halves, and computes required metrics."""
-    content = read_gzip_file(file_path)
-    tokens = tokenize(content)
-    total_count = len(tokens)
+def analyze_file(file_path, growth=None):
+    """
+    Analyzes token counts, splits halves, and computes required metrics.
+    One pass over the cached token id array: the midpoint is known from its
+    length, and each half is counted with bincount into per-id count arrays.
+    Ids are numbered by first occurrence, so walking them in id order gives
+    the same order (and Counter tie order) as counting the token list.
+    growth="log" or growth=N (every N tokens) adds the vocabulary growth curve
+    and the Heaps' law fit (K, beta) to the results.
+    """
+    corpus = load_corpus(file_path)
+    ids, vocab = corpus.ids, corpus.vocab
+    total_count = len(ids)
 
-    # Split into halves
+    # Count token types in each half
     mid_index = total_count // 2
-    first_half = tokens[:mid_index]
-    second_half = tokens[mid_index:]
+    first_half_counts = np.bincount(ids[:mid_index], minlength=len(vocab))
+    second_half_counts = np.bincount(ids[mid_index:], minlength=len(vocab))
+    full = first_half_counts + second_half_counts
+    full_counts = Counter(dict(zip(vocab, full.tolist())))
 
-    # Count token types in each half
-    first_half_counts = count_token_types(first_half)
-    second_half_counts = count_token_types(second_half)
-    full_counts = count_token_types(tokens)
+    # Types first seen in the second half, in order of first occurrence
+    added_ids = np.flatnonzero(first_half_counts == 0)
+    added_counts = second_half_counts[added_ids]
 
-    # Distinct types
-    distinct_first_half = set(first_half_counts.keys())
-    distinct_full = set(full_counts.keys())
-    added_types = distinct_full - distinct_first_half
+    def added_more_than(threshold):
+        return [vocab[i] for i in added_ids[added_counts > threshold]]
 
-    # Identify tokens meeting frequency thresholds in the second half
-    more_than_two = [t for t, c in second_half_counts.items() if t not in distinct_first_half and c > 2]
-    more_than_five = [t for t, c in second_half_counts.items() if t not in distinct_first_half and c > 5]
-    more_than_ten = [t for t, c in second_half_counts.items() if t not in distinct_first_half and c > 10]
+    results = {
+        "total_tokens": total_count,
+        "distinct_first_half": int(np.count_nonzero(first_half_counts)),
+        "distinct_full": len(full_counts),
+        "added_types": set(vocab[i] for i in added_ids),
+        "more_than_two": added_more_than(2),
+        "more_than_five": added_more_than(5),
+        "more_than_ten": added_more_than(10),
+        "full_counts": full_counts
+    }
+
+    if growth is not None:
+        checkpoints = log_checkpoints(total_count) if growth == "log" else every_checkpoints(total_count, growth)
+        curve = growth_curve(ids, checkpoints)
+        results["growth"] = curve
+        results["heaps"] = fit_heaps(curve["tokens"], curve["types"])
+
+    return results
+
+
+def estimate_types(file_path, precision=DEFAULT_PRECISION):
+    """
+    Streaming estimate of the distinct type counts of analyze_file, with
+    HyperLogLog sketches instead of Counters, so memory stays at a few KiB.
+    The midpoint has to be known up front: if the file's corpus cache exists
+    its token count is read from there, and one pass sketches the first half,
+    then continues a copy of that sketch over the rest. Otherwise a first pass
+    counts the tokens too, and a second one reads the file again up to the
+    midpoint, so decompression and tokenizing cost up to 1.5x.
+    distinct_full and distinct_first_half come back as (estimate, standard error) pairs.
+    """
+    first_half = HyperLogLog(precision)
+    total_count = cached_token_count(file_path)
+    if total_count is not None:
+        tokens = iter_gzip_tokens(file_path)
+        first_half.update(islice(tokens, total_count // 2))
+        full = first_half.copy()
+        full.update(tokens)
+    else:
+        full = HyperLogLog(precision)
+        total_count = 0
+
+        def counted(tokens):
+            nonlocal total_count
+            for token in tokens:
+                total_count += 1
+                yield token
+
+        full.update(counted(iter_gzip_tokens(file_path)))
+        first_half.update(islice(iter_gzip_tokens(file_path), total_count // 2))
 
     return {
         "total_tokens": total_count,
-        "distinct_first_half": len(distinct_first_half),
-        "distinct_full": len(distinct_full),
-        "added_types": added_types,
-        "more_than_two": more_than_two,
-        "more_than_five": more_than_five,
-        "more_than_ten": more_than_ten,
-        "full_counts": full_counts
+        "distinct_first_half": first_half.estimate_with_error(),
+        "distinct_full": full.estimate_with_error(),
+        "sketch": full,
     }
 
 
@@ -94,13 +140,77 @@ def frequency_buckets(counts):
     return freq_buckets
 
 
-def main():
-    # Analyze English and Hebrew files
+# Bucket lower edges for bucket_counts: every count falls in exactly one bucket
+DEFAULT_BUCKET_EDGES = (1, 2, 3, 4, 5, 6, 10, 100, 1000, 10000)
+
+
+def count_values(counts):
+    """The count values of a Counter (or an array of counts) as an int64 array."""
+    if isinstance(counts, np.ndarray):
+        return counts.astype(np.int64, copy=False)
+    return np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+
+
+def frequency_spectrum(counts):
+    """
+    Frequency of frequencies: returns (frequencies, types) where types[i] is the
+    number of types seen exactly frequencies[i] times, frequencies ascending.
+    Uses bincount, unless the largest count would make its table much longer
+    than the number of types.
+    """
+    values = count_values(counts)
+    if not len(values):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if values.max() <= 4 * len(values) + 1024:
+        table = np.bincount(values)
+        frequencies = np.flatnonzero(table)
+        return frequencies, table[frequencies]
+    return np.unique(values, return_counts=True)
+
+
+def bucket_counts(counts, edges=DEFAULT_BUCKET_EDGES):
+    """
+    Number of types per frequency bucket. edges are ascending lower edges;
+    bucket i holds counts in [edges[i], edges[i + 1]) and the last one is open.
+    Returns (label, types) pairs, e.g. ("4", n), ("6-9", n), ("10,000+", n).
+    """
+    return spectrum_buckets(*frequency_spectrum(counts), edges=edges)
+
+
+def spectrum_buckets(frequencies, types, edges=DEFAULT_BUCKET_EDGES):
+    """bucket_counts from a frequency spectrum, as returned by frequency_spectrum."""
+    edges = np.asarray(edges, dtype=np.int64)
+    bucket = np.searchsorted(edges, np.asarray(frequencies, dtype=np.int64), side='right') - 1
+    keep = bucket >= 0
+    types = np.bincount(bucket[keep], weights=np.asarray(types)[keep], minlength=len(edges)).astype(np.int64)
+
+    labels = []
+    for i, lo in enumerate(edges):
+        if i == len(edges) - 1:
+            labels.append(f"{lo:,}+")
+        elif edges[i + 1] - lo == 1:
+            labels.append(f"{lo:,}")
+        else:
+            labels.append(f"{lo:,}-{edges[i + 1] - 1:,}")
+    return list(zip(labels, types.tolist()))
+
+
+def rank_frequency(counts):
+    """
+    Rank-frequency (Zipf) table: returns (ranks, frequencies) with the counts
+    sorted in decreasing order and ranks starting at 1.
+    """
+    frequencies = np.sort(count_values(counts))[::-1]
+    return np.arange(1, len(frequencies) + 1), frequencies
+
+
+def main(workers=None, memory_limit_mb=None):
+    # Analyze English and Hebrew files, in parallel
     english_path = "english.txt.gz"
     hebrew_path = "hebrew.txt.gz"
 
-    english_data = analyze_file(english_path)
-    hebrew_data = analyze_file(hebrew_path)
+    english_data, hebrew_data = map_files(partial(analyze_file, growth="log"), [english_path, hebrew_path],
+                                          workers, memory_limit_mb)
 
     for lang, data in [("English", english_data), ("Hebrew", hebrew_data)]:
         print(f"\nAnalysis for {lang}:")
@@ -113,6 +223,8 @@ def main():
         print(f"   > More than 2 times: {data['more_than_two'][:5]}")
         print(f"   > More than 5 times: {data['more_than_five'][:5]}")
         print(f"   > More than 10 times: {data['more_than_ten'][:5]}")
+        heaps_k, heaps_beta = data["heaps"]
+        print(f"7. Heaps' law fit (types = K * tokens^beta): K={heaps_k:.2f}, beta={heaps_beta:.3f}")
 
         # Top 50 tokens
         top_50 = top_n_tokens(data["full_counts"])
@@ -126,6 +238,12 @@ def main():
         for bucket, count in buckets.items():
             print(f"{bucket}: {count}")
 
+        # Every count in exactly one bucket
+        print(f"\nFrequency Spectrum:")
+        for bucket, count in bucket_counts(data["full_counts"]):
+            print(f"{bucket}: {count}")
+
 
 if __name__ == "__main__":
-    main()
+    # python unigrams_final.py [workers] [memory limit per file in MB]
+    main(*[int(arg) for arg in sys.argv[1:3]])
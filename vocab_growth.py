@@ -0,0 +1,78 @@
+import numpy as np
+
+# ids scanned per step of first_occurrences
+OCCURRENCE_BLOCK = 1 << 22
+
+
+def log_checkpoints(total, points=50):
+    """About `points` checkpoints spaced logarithmically from 1 to total tokens."""
+    if total < 1:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.geomspace(1, total, points).astype(np.int64))
+
+
+def every_checkpoints(total, step):
+    """A checkpoint every `step` tokens, plus one at the end."""
+    if step <= 0:
+        raise ValueError(f"checkpoint step must be positive, got {step}")
+    points = np.arange(step, total + 1, step, dtype=np.int64)
+    if total > 0 and (not len(points) or points[-1] != total):
+        points = np.r_[points, total]
+    return points
+
+
+def first_occurrences(ids, block=OCCURRENCE_BLOCK):
+    """
+    Position of the first and second occurrence of every id (len(ids) if it
+    never occurs that often), in one pass over the ids in blocks.
+    Memory is two int64 arrays of the vocabulary size plus one block; the ids
+    are never sorted as a whole; np.unique picks the earliest position of each
+    id within a block.
+    """
+    ids = np.asarray(ids)
+    size = int(ids.max()) + 1 if len(ids) else 0
+    first = np.full(size, len(ids), dtype=np.int64)
+    second = np.full(size, len(ids), dtype=np.int64)
+    for start in range(0, len(ids), block):
+        chunk = ids[start:start + block]
+        values, at = np.unique(chunk, return_index=True)
+        new = first[values] == len(ids)
+        first[values[new]] = start + at[new]
+        # the earliest of the remaining positions is the second occurrence
+        rest = np.flatnonzero((first[chunk] != start + np.arange(len(chunk))) & (second[chunk] == len(ids)))
+        values, at = np.unique(chunk[rest], return_index=True)
+        second[values] = start + rest[at]
+    return first, second
+
+
+def growth_curve(ids, checkpoints):
+    """
+    Vocabulary growth at each checkpoint t (the first t tokens): distinct types,
+    hapaxes (types seen exactly once so far) and the rate of new types per token
+    since the previous checkpoint.
+    Every type is reduced to the positions of its first and second occurrence
+    (first_occurrences, a streaming pass with memory in the vocabulary size),
+    so all checkpoints come out of two sorts of vocabulary-sized arrays.
+    """
+    ids = np.asarray(ids)
+    checkpoints = np.asarray(checkpoints, dtype=np.int64)
+    first, second = first_occurrences(ids)
+    # ids that never occur (or only once) sort to the end, past every checkpoint
+    first, second = np.sort(first), np.sort(second)
+
+    types = np.searchsorted(first, checkpoints)
+    hapaxes = types - np.searchsorted(second, checkpoints)
+    new_type_rate = np.diff(np.r_[0, types]) / np.diff(np.r_[0, checkpoints])
+    return {"tokens": checkpoints, "types": types, "hapaxes": hapaxes, "new_type_rate": new_type_rate}
+
+
+def fit_heaps(tokens, types):
+    """
+    Least-squares fit of Heaps' law, types = K * tokens ** beta, on log-log scale.
+    Returns (K, beta).
+    """
+    tokens, types = np.asarray(tokens, dtype=np.float64), np.asarray(types, dtype=np.float64)
+    keep = (tokens > 0) & (types > 0)
+    design = np.column_stack((np.ones(keep.sum()), np.log(tokens[keep])))
+    (log_k, beta), *_ = np.linalg.lstsq(design, np.log(types[keep]), rcond=None)
+    return float(np.exp(log_k)), float(beta)